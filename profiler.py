@@ -76,7 +76,7 @@ def run(position, time_sec, engine_name):
     print(f'\n\nPosition: {position}')
     uci.handle_position(['fen'] + position.split())
 
-    uci.engine.time_limit = int(time_sec * 1000)
+    uci.engine.time_manager.set_fixed(int(time_sec * 1000))
 
     print(f'Time: {time_sec}s\n')
 
@@ -13,7 +13,7 @@ from engine.core.constants import (
     NORTH, SOUTH, SQUARE_TO_BB
 )
 from engine.core.zobrist import ZOBRIST_KEYS
-from engine.search.evaluation import MG_TABLE, EG_TABLE, PHASE_WEIGHTS
+from engine.search.evaluation import MG_TABLE, EG_TABLE, PHASE_WEIGHTS, MATERIAL_DELTA
 
 
 def is_repetition(state: State):
@@ -38,41 +38,6 @@ def is_repetition(state: State):
     
     return threefold, fivefold
 
-def has_insufficient_material(state: State):
-    bitboards = state.bitboards
-    
-    # if there are pawns, rooks, or queens, there's sufficient material
-    if bitboards[WP] or bitboards[BP] or bitboards[WR] or bitboards[BR] or bitboards[WQ] or bitboards[BQ]: return False
-    
-    # count pieces
-    w_knights = bitboards[WN].bit_count()
-    w_bishops = bitboards[WB].bit_count()
-    b_knights = bitboards[BN].bit_count()
-    b_bishops = bitboards[BB].bit_count()
-    
-    total_minors = w_knights + w_bishops + b_knights + b_bishops
-    
-    # king vs king
-    if total_minors == 0:
-        return True
-    
-    # king + minor vs king
-    if total_minors == 1:
-        return True
-    
-    # king + bishop vs king + bishop (same colour bishops)
-    if w_bishops == 1 and b_bishops == 1 and w_knights == 0 and b_knights == 0:
-        # check if bishops are on same colour squares
-        w_bishop_sq = (bitboards[WB] & -bitboards[WB]).bit_length() - 1
-        b_bishop_sq = (bitboards[BB] & -bitboards[BB]).bit_length() - 1
-        
-        w_bishop_colour = (w_bishop_sq // 8 + w_bishop_sq % 8) % 2
-        b_bishop_colour = (b_bishop_sq // 8 + b_bishop_sq % 8) % 2
-        
-        if w_bishop_colour == b_bishop_colour: return True
-    
-    return False
-
 def make_null_move(state: State):
     old_ep = state.en_passant_square
     old_hash = state.hash
@@ -102,6 +67,8 @@ def unmake_null_move(state: State):
 
 def make_move(state: State, move: int):
     old_hash = state.hash
+    old_pawn_hash = state.pawn_hash
+    old_material_key = state.material_key
     old_castling = state.castling_rights
     old_ep = state.en_passant_square
     old_halfmove = state.halfmove_clock
@@ -144,6 +111,9 @@ def make_move(state: State, move: int):
     bitboards[active_bb] &= ~start_mask
     state.hash ^= ZOBRIST_KEYS.pieces[moving_piece][start_sq]
     board[start_sq] = NULL
+
+    piece_type = moving_piece & ~WHITE
+    if piece_type == PAWN: state.pawn_hash ^= ZOBRIST_KEYS.pieces[moving_piece][start_sq]
     
     captured_piece = NULL
 
@@ -156,6 +126,7 @@ def make_move(state: State, move: int):
             bitboards[captured_piece] &= ~cap_mask
             bitboards[opponent_bb] &= ~cap_mask
             state.hash ^= ZOBRIST_KEYS.pieces[captured_piece][capture_sq]
+            state.pawn_hash ^= ZOBRIST_KEYS.pieces[captured_piece][capture_sq]
             board[capture_sq] = NULL
             
             state.mg_score -= MG_TABLE[captured_piece][capture_sq]
@@ -163,6 +134,7 @@ def make_move(state: State, move: int):
             state.phase -= PHASE_WEIGHTS[captured_piece]
 
             state.piece_counts[captured_piece] -= 1
+            state.material_key -= MATERIAL_DELTA[captured_piece]
             
             # update passed pawn tracking if pawn captured
             if not state.is_white:
@@ -181,10 +153,12 @@ def make_move(state: State, move: int):
             state.phase -= PHASE_WEIGHTS[captured_piece]
             
             state.piece_counts[captured_piece] -= 1
+            state.material_key -= MATERIAL_DELTA[captured_piece]
             
             # update passed pawn tracking if pawn captured
             captured_type = captured_piece & ~WHITE
             if captured_type == PAWN:
+                state.pawn_hash ^= ZOBRIST_KEYS.pieces[captured_piece][target_sq]
                 if captured_piece & WHITE:
                     state.white_passed_pawns &= ~target_mask
                 else:
@@ -202,6 +176,7 @@ def make_move(state: State, move: int):
         
         state.piece_counts[moving_piece] -= 1
         state.piece_counts[promoted_piece] += 1
+        state.material_key += MATERIAL_DELTA[promoted_piece] - MATERIAL_DELTA[moving_piece]
         
         # remove promoted pawn from passed pawn tracking
         if state.is_white:
@@ -220,8 +195,8 @@ def make_move(state: State, move: int):
     board[target_sq] = target_piece
     
     # update passed pawn tracking if pawn moved
-    piece_type = moving_piece & ~WHITE
     if piece_type == PAWN and not (move & PROMO_FLAG):
+        state.pawn_hash ^= ZOBRIST_KEYS.pieces[moving_piece][target_sq]
         if state.is_white:
             state.white_passed_pawns &= ~start_mask
             state.white_passed_pawns |= target_mask
@@ -302,12 +277,14 @@ def make_move(state: State, move: int):
         old_phase,
         old_w_passed,
         old_b_passed,
-        old_last_moved
+        old_last_moved,
+        old_pawn_hash,
+        old_material_key
     ))
 
 def unmake_move(state: State, move: int):
     undo_info = state.context_stack.pop()
-    captured_piece, old_castling, old_ep, old_halfmove, old_hash, old_mg, old_eg, old_phase, old_w_passed, old_b_passed, old_last_moved = undo_info
+    captured_piece, old_castling, old_ep, old_halfmove, old_hash, old_mg, old_eg, old_phase, old_w_passed, old_b_passed, old_last_moved, old_pawn_hash, old_material_key = undo_info
     
     if old_hash is None: return
 
@@ -319,6 +296,8 @@ def unmake_move(state: State, move: int):
     
     state.history.pop()
     state.hash = old_hash
+    state.pawn_hash = old_pawn_hash
+    state.material_key = old_material_key
     state.castling_rights = old_castling
     state.en_passant_square = old_ep
     state.halfmove_clock = old_halfmove
@@ -18,6 +18,8 @@ class State:
     context_stack: List[tuple] = field(default_factory=list) # stack for undo information
 
     hash: int = 0
+    pawn_hash: int = 0 # zobrist key of the pawns alone, for the pawn hash table
+    material_key: int = 0 # piece counts packed 4 bits per piece, for the material hash table
     mg_score: int = 0
     eg_score: int = 0
     phase: int = 0
@@ -104,6 +104,14 @@ BISHOP_MOBILITY = 3
 ROOK_MOBILITY = 3
 QUEEN_MOBILITY = 1
 
+# endgame scaling, the eval is multiplied by factor / SCALE_NORMAL
+SCALE_NORMAL = 64
+SCALE_DRAW = 0
+
+# lazy evaluation, how far the terms after each stage can still move the score
+LAZY_MARGIN_PAWNS = 300 # after material, psqt and pawns
+LAZY_MARGIN_PIECES = 280 # after rooks, outposts and king safety
+
 # trading behaviour
 WINNING_THRESHOLD = 200
 LOSING_THRESHOLD = -100
@@ -130,6 +138,8 @@ FIFTY_MOVE_SCALE_START = 90 # Start scaling contempt
 # pruning margins
 RAZOR_MARGIN = [0, 240, 280, 300]
 STATIC_NULL_MARGIN = 120
+RFP_MARGIN = 120 # reverse futility, per depth
+RFP_MAX_DEPTH = 3
 FUTILITY_MARGIN = [0, 100, 180, 270] # per depth
 
 # late move reductions
@@ -151,8 +161,10 @@ SINGULAR_EXTENSION = 0  # too slow so removed
 SINGULAR_MARGIN = 50
 
 # history
-HISTORY_MAX = 16384
-HISTORY_GRAVITY = 16 # for aging
+HISTORY_MAX = 16384 # gravity keeps every entry within this bound
+HISTORY_AGE_SHIFT = 1 # history is halved at the start of every search
+CAPTURE_HISTORY_DIVISOR = 8 # capture history / divisor is added to MVV-LVA
+QS_HISTORY_DEPTH = 1 # depth credited to qsearch cutoffs
 
 # file masks
 FILE_A = 0x0101010101010101
@@ -203,4 +215,27 @@ WEST  = -EAST
 
 # search configuration
 MAX_DEPTH = 100
-TIME_CHECK_NODES = 1023
\ No newline at end of file
+MAX_PLY = 128 # search stack / pv table size, extensions can take a line past MAX_DEPTH
+MAX_MOVES = 256 # move buffer size, no position has more pseudo-legal moves
+TIME_CHECK_NODES = 1023
+
+# eval cache (MB)
+EVAL_HASH_MB = 8
+MAX_EVAL_HASH_MB = 1024
+
+# time management (ms)
+MOVE_OVERHEAD = 200 # reserved per move for GUI / process latency
+DEFAULT_MOVE_TIME = 2000 # 'go' without any time information
+MIN_MOVES_TO_GO = 20
+MAX_MOVES_TO_GO = 50
+INCREMENT_USAGE = 0.75 # share of the increment spent on this move
+HARD_LIMIT_SCALE = 4 # hard limit = optimum * scale
+MAX_TIME_USAGE = 0.8 # never plan on more of the remaining clock than this
+
+# soft limit scaling after each iteration
+STABILITY_SCALE = [1.4, 1.15, 1.0, 0.85, 0.75, 0.65] # by iterations with the same best move
+SCORE_DROP_MARGIN = 30
+SCORE_DROP_SCALE = 1.25
+SCORE_STEADY_MARGIN = 10
+SCORE_STEADY_SCALE = 0.9
+FAIL_LOW_SCALE = 1.3
\ No newline at end of file
@@ -11,8 +11,11 @@ class ZobristKeys:
     en_passant: List[int]
     black_to_move: int
 
+# fixed so hashes are reproducible across runs (saved hash files depend on it)
+ZOBRIST_SEED = 42
+
 def init_zobrist():
-    random.seed(42)
+    random.seed(ZOBRIST_SEED)
     
     # piece keys
     pieces = [[random.getrandbits(64) for _ in range(64)] for _ in range(16)]
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Tuple
 from engine.core.constants import (
     NULL, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
     CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ,
@@ -8,9 +8,9 @@ from engine.core.constants import (
     MASK_SOURCE,
     WP, BP, WN, BN, WB, BB, WR, BR, WQ, BQ, WK, BK,
     WHITE, BLACK, NORTH, SOUTH,
-    SQUARE_TO_BB
+    SQUARE_TO_BB, MAX_MOVES
 )
-from engine.core.move import SHIFT_TARGET
+from engine.core.move import SHIFT_TARGET, SHIFT_FLAG
 from engine.board.state import State
 from engine.core.move import (
     QUIET, CAPTURE, EN_PASSANT,
@@ -19,22 +19,32 @@ from engine.core.move import (
     PROMO_CAP_N, PROMO_CAP_B, PROMO_CAP_R, PROMO_CAP_Q,
     DOUBLE_PUSH, _pack
 )
-from engine.moves.legality import is_legal, is_square_attacked
+from engine.moves.legality import is_square_attacked, is_square_attacked_occ, get_attackers
 
 from engine.moves.precomputed import (
     KNIGHT_ATTACKS, KING_ATTACKS,
     ROOK_TABLE, ROOK_MASKS,
     BISHOP_TABLE, BISHOP_MASKS,
-    WHITE_PAWN_ATTACKS, BLACK_PAWN_ATTACKS
+    WHITE_PAWN_ATTACKS, BLACK_PAWN_ATTACKS,
+    BETWEEN
 )
 
+# scratch buffer for is_pseudo_legal, a single piece never has more than 27 moves
+_PIECE_BUFFER = [0] * 32
+
 def get_legal_moves(state: State, captures_only=False) -> List[int]:
-    pseudo_legal = generate_pseudo_legal_moves(state, captures_only)
-    return [move for move in pseudo_legal if is_legal(state, move)]
+    moves = [0] * MAX_MOVES
+    count = generate_legal_moves(state, moves, captures_only)
+    return moves[:count]
 
 def generate_pseudo_legal_moves(state: State, captures_only=False) -> List[int]:
     """Generate all pseudo-legal moves"""
-    moves: List[int] = []
+    moves = [0] * MAX_MOVES
+    count = generate_moves(state, moves, captures_only)
+    return moves[:count]
+
+def generate_moves(state: State, moves: List[int], captures_only=False, quiets_only=False) -> int:
+    """Write pseudo-legal moves into a preallocated buffer, returns how many were written"""
     bitboards = state.bitboards
     all_pieces = bitboards[WHITE] | bitboards[BLACK]
     
@@ -49,56 +59,252 @@ def generate_pseudo_legal_moves(state: State, captures_only=False) -> List[int]:
         P, N, B, R, Q, K = BLACK_PIECES
         pawn_attacks = BLACK_PAWN_ATTACKS
 
-    _gen_pawn_moves(state, moves, P, state.is_white, all_pieces, opponent, pawn_attacks, captures_only)
-    _gen_knight_moves(bitboards[N], moves, active, opponent, captures_only)
-    _gen_king_moves(bitboards[K], moves, active, opponent, captures_only)
-    if not captures_only: _gen_castling_moves(state, moves, all_pieces)
-    _gen_bishop_moves(bitboards[B], moves, all_pieces, active, opponent, captures_only)
-    _gen_rook_moves(bitboards[R], moves, all_pieces, active, opponent, captures_only)
-    _gen_queen_moves(bitboards[Q], moves, all_pieces, active, opponent, captures_only)
+    # quiets are everything a capture-only pass leaves out: pushes (incl. promotions), castling, moves to empty squares
+    if captures_only: target_mask = opponent
+    elif quiets_only: target_mask = ~all_pieces
+    else: target_mask = ~active
+
+    count = _gen_pawn_moves(state, moves, 0, bitboards[P], state.is_white, all_pieces, opponent, pawn_attacks, target_mask)
+    if not quiets_only: count = _gen_en_passant(state, moves, count, bitboards[P], pawn_attacks)
+    count = _gen_knight_moves(bitboards[N], moves, count, target_mask, opponent)
+    count = _gen_king_moves(bitboards[K], moves, count, target_mask, opponent)
+    if not captures_only: count = _gen_castling_moves(state, moves, count, all_pieces)
+    count = _gen_bishop_moves(bitboards[B], moves, count, all_pieces, target_mask, opponent)
+    count = _gen_rook_moves(bitboards[R], moves, count, all_pieces, target_mask, opponent)
+    count = _gen_queen_moves(bitboards[Q], moves, count, all_pieces, target_mask, opponent)
     
-    return moves
+    return count
+
+def is_pseudo_legal(state: State, move) -> bool:
+    """Would generate_moves emit this move here? Used to validate TT moves and killers without generating everything"""
+    if not move: return False
+
+    from_sq = move & MASK_SOURCE
+    piece = state.board[from_sq]
+    if piece == NULL or bool(piece & WHITE) != state.is_white: return False
+
+    bitboards = state.bitboards
+    all_pieces = bitboards[WHITE] | bitboards[BLACK]
+    if state.is_white:
+        active, opponent, pawn_attacks = bitboards[WHITE], bitboards[BLACK], WHITE_PAWN_ATTACKS
+    else:
+        active, opponent, pawn_attacks = bitboards[BLACK], bitboards[WHITE], BLACK_PAWN_ATTACKS
+
+    # generate for the one piece on from_sq only
+    piece_bb = SQUARE_TO_BB[from_sq]
+    piece_type = piece & ~WHITE
+    buffer = _PIECE_BUFFER
+    if piece_type == PAWN:
+        count = _gen_pawn_moves(state, buffer, 0, piece_bb, state.is_white, all_pieces, opponent, pawn_attacks, ~active)
+        count = _gen_en_passant(state, buffer, count, piece_bb, pawn_attacks)
+    elif piece_type == KNIGHT: count = _gen_knight_moves(piece_bb, buffer, 0, ~active, opponent)
+    elif piece_type == BISHOP: count = _gen_bishop_moves(piece_bb, buffer, 0, all_pieces, ~active, opponent)
+    elif piece_type == ROOK: count = _gen_rook_moves(piece_bb, buffer, 0, all_pieces, ~active, opponent)
+    elif piece_type == QUEEN: count = _gen_queen_moves(piece_bb, buffer, 0, all_pieces, ~active, opponent)
+    else:
+        count = _gen_king_moves(piece_bb, buffer, 0, ~active, opponent)
+        count = _gen_castling_moves(state, buffer, count, all_pieces)
+
+    for i in range(count):
+        if buffer[i] == move: return True
+    return False
+
+def get_pins_and_checkers(state: State) -> Tuple[int, int, int, dict]:
+    """Checkers of the side to move's king, the squares that stop the check, and pinned pieces with their rays"""
+    bitboards = state.bitboards
+    all_pieces = bitboards[WHITE] | bitboards[BLACK]
+
+    if state.is_white:
+        active = bitboards[WHITE]
+        king_bb = bitboards[WK]
+        rook_likes = bitboards[BR] | bitboards[BQ]
+        bishop_likes = bitboards[BB] | bitboards[BQ]
+    else:
+        active = bitboards[BLACK]
+        king_bb = bitboards[BK]
+        rook_likes = bitboards[WR] | bitboards[WQ]
+        bishop_likes = bitboards[WB] | bitboards[WQ]
+
+    king_sq = (king_bb & -king_bb).bit_length() - 1
+    checkers = get_attackers(state, king_sq, not state.is_white)
+
+    # no check: anything goes, single check: capture or block, double check: king moves only
+    if not checkers: check_mask = ~0
+    elif checkers & (checkers - 1): check_mask = 0
+    else: check_mask = checkers | BETWEEN[king_sq][checkers.bit_length() - 1]
+
+    # enemy sliders that would see the king on an empty board
+    snipers = (ROOK_TABLE[king_sq][0] & rook_likes) | (BISHOP_TABLE[king_sq][0] & bishop_likes)
+    pinned = 0
+    pin_rays = {}
+    while snipers:
+        lsb = snipers & -snipers
+        sniper_sq = lsb.bit_length() - 1
+        snipers &= snipers - 1
+
+        between = BETWEEN[king_sq][sniper_sq]
+        blockers = between & all_pieces
+        if blockers and not (blockers & (blockers - 1)) and (blockers & active):
+            pinned |= blockers
+            pin_rays[blockers.bit_length() - 1] = between | lsb
+
+    return checkers, check_mask, pinned, pin_rays
+
+def generate_legal_moves(state: State, moves: List[int], captures_only=False, quiets_only=False, pins=None) -> int:
+    """Like generate_moves but only writes legal moves, so the search never has to make a move to test it"""
+    if pins is None: pins = get_pins_and_checkers(state)
+    checkers, check_mask, pinned, pin_rays = pins
+
+    bitboards = state.bitboards
+    all_pieces = bitboards[WHITE] | bitboards[BLACK]
+    colour = state.is_white
+    
+    if colour:
+        active = bitboards[WHITE]
+        opponent = bitboards[BLACK]
+        P, N, B, R, Q, K = WHITE_PIECES
+        pawn_attacks = WHITE_PAWN_ATTACKS
+    else:
+        active = bitboards[BLACK]
+        opponent = bitboards[WHITE]
+        P, N, B, R, Q, K = BLACK_PIECES
+        pawn_attacks = BLACK_PAWN_ATTACKS
+
+    if captures_only: target_mask = opponent
+    elif quiets_only: target_mask = ~all_pieces
+    else: target_mask = ~active
+
+    # king steps are tested with the king lifted off the board, so it cannot hide behind itself from a slider
+    king_bb = bitboards[K]
+    king_sq = (king_bb & -king_bb).bit_length() - 1
+    occupancy = all_pieces ^ king_bb
+    count = 0
+
+    targets = KING_ATTACKS[king_sq] & target_mask
+    while targets:
+        t_lsb = targets & -targets
+        to_sq = t_lsb.bit_length() - 1
+        targets &= targets - 1
+        if not is_square_attacked_occ(state, to_sq, not colour, occupancy):
+            moves[count] = _pack(king_sq, to_sq, CAPTURE if t_lsb & opponent else QUIET)
+            count += 1
+
+    if checkers & (checkers - 1): return count
+
+    if not checkers and not captures_only: count = _gen_castling_moves(state, moves, count, all_pieces)
 
-def _gen_pawn_moves(state: State, moves: List[int], pawn_key: int, colour: bool, all_pieces: int, enemy: int, attack_table: List[int], captures_only: bool):
-    pawns = state.bitboards[pawn_key]
+    # every other move has to stop a check (check_mask is all ones when not in check)
+    mask = target_mask & check_mask
+    free = ~pinned
+    count = _gen_pawn_moves(state, moves, count, bitboards[P] & free, colour, all_pieces, opponent, pawn_attacks, mask)
+    count = _gen_knight_moves(bitboards[N] & free, moves, count, mask, opponent)
+    count = _gen_bishop_moves(bitboards[B] & free, moves, count, all_pieces, mask, opponent)
+    count = _gen_rook_moves(bitboards[R] & free, moves, count, all_pieces, mask, opponent)
+    count = _gen_queen_moves(bitboards[Q] & free, moves, count, all_pieces, mask, opponent)
+
+    # pinned pieces can only move along the pin, so a pinned knight never moves
+    for sq, ray in pin_rays.items():
+        piece_bb = SQUARE_TO_BB[sq]
+        ray_mask = mask & ray
+        if piece_bb & bitboards[P]: count = _gen_pawn_moves(state, moves, count, piece_bb, colour, all_pieces, opponent, pawn_attacks, ray_mask)
+        elif piece_bb & bitboards[B]: count = _gen_bishop_moves(piece_bb, moves, count, all_pieces, ray_mask, opponent)
+        elif piece_bb & bitboards[R]: count = _gen_rook_moves(piece_bb, moves, count, all_pieces, ray_mask, opponent)
+        elif piece_bb & bitboards[Q]: count = _gen_queen_moves(piece_bb, moves, count, all_pieces, ray_mask, opponent)
+
+    if not quiets_only and state.en_passant_square != NULL:
+        start = count
+        count = _gen_en_passant(state, moves, count, bitboards[P], pawn_attacks)
+        kept = start
+        for i in range(start, count):
+            if _is_legal_en_passant(state, moves[i], king_sq, all_pieces):
+                moves[kept] = moves[i]
+                kept += 1
+        count = kept
+
+    return count
+
+def is_legal_move(state: State, move: int, pins) -> bool:
+    """Legality of a pseudo-legal move from the node's pin and check info, without making it"""
+    checkers, check_mask, pinned, pin_rays = pins
+
+    from_sq = move & MASK_SOURCE
+    to_sq = (move >> SHIFT_TARGET) & MASK_SOURCE
+    flag = (move >> SHIFT_FLAG) & 0xF
+    from_bb = SQUARE_TO_BB[from_sq]
+    bitboards = state.bitboards
+    all_pieces = bitboards[WHITE] | bitboards[BLACK]
+    king_bb = bitboards[WK if state.is_white else BK]
+
+    if from_bb & king_bb:
+        # castling squares were already checked by the generator
+        if flag == CASTLE_KS or flag == CASTLE_QS: return True
+        return not is_square_attacked_occ(state, to_sq, not state.is_white, all_pieces ^ king_bb)
+
+    if flag == EN_PASSANT:
+        king_sq = (king_bb & -king_bb).bit_length() - 1
+        return _is_legal_en_passant(state, move, king_sq, all_pieces)
+
+    if checkers & (checkers - 1): return False
+
+    to_bb = SQUARE_TO_BB[to_sq]
+    if not (to_bb & check_mask): return False
+    if (from_bb & pinned) and not (to_bb & pin_rays[from_sq]): return False
+    return True
+
+def _is_legal_en_passant(state: State, move: int, king_sq: int, all_pieces: int) -> bool:
+    # two pieces leave the rank at once, so test the king against the resulting occupancy
+    from_sq = move & MASK_SOURCE
+    to_sq = state.en_passant_square
+    captured = SQUARE_TO_BB[to_sq - NORTH] if state.is_white else SQUARE_TO_BB[to_sq + NORTH]
+    occupancy = (all_pieces ^ SQUARE_TO_BB[from_sq] ^ captured) | SQUARE_TO_BB[to_sq]
+    return not is_square_attacked_occ(state, king_sq, not state.is_white, occupancy, captured)
+
+def _gen_pawn_moves(state: State, moves: List[int], count: int, pawns: int, colour: bool, all_pieces: int, enemy: int, attack_table: List[int], target_mask: int):
     if colour == WHITE:
         direction = NORTH
         start_rank_mask = RANK_3
         promotion_rank = A8
         single_push = (pawns << NORTH) & ~all_pieces
-        double_push = ((single_push & start_rank_mask) << NORTH) & ~all_pieces
+        double_push = ((single_push & start_rank_mask) << NORTH) & ~all_pieces & target_mask
     else:
         direction = SOUTH
         start_rank_mask = RANK_6
         promotion_rank = H1
         single_push = (pawns >> NORTH) & ~all_pieces
-        double_push = ((single_push & start_rank_mask) >> NORTH) & ~all_pieces
+        double_push = ((single_push & start_rank_mask) >> NORTH) & ~all_pieces & target_mask
     
-    if not captures_only:
-        # single pushes
-        bb = single_push
-        while bb:
-            lsb = bb & -bb
-            to_sq = lsb.bit_length() - 1
-            bb &= bb - 1
-            
-            from_sq = to_sq - direction
-            is_promo = (colour == WHITE and to_sq >= promotion_rank) or (colour == BLACK and to_sq <= promotion_rank)
-            
-            if is_promo: 
-                _add_promotions(moves, from_sq, to_sq, False)
-            else:
-                moves.append(_pack(from_sq, to_sq, QUIET))
-                
-        # double pushes
-        bb = double_push
-        while bb:
-            lsb = bb & -bb
-            to_sq = lsb.bit_length() - 1
-            bb &= bb - 1
+    # the double push is found through the unmasked single push, so mask only afterwards
+    single_push &= target_mask
+
+    # single pushes
+    bb = single_push
+    while bb:
+        lsb = bb & -bb
+        to_sq = lsb.bit_length() - 1
+        bb &= bb - 1
+        
+        from_sq = to_sq - direction
+        is_promo = (colour == WHITE and to_sq >= promotion_rank) or (colour == BLACK and to_sq <= promotion_rank)
+        
+        if is_promo: 
+            count = _add_promotions(moves, count, from_sq, to_sq, False)
+        else:
+            moves[count] = _pack(from_sq, to_sq, QUIET)
+            count += 1
             
-            from_sq = to_sq - (2 * direction)
-            moves.append(_pack(from_sq, to_sq, DOUBLE_PUSH))
+    # double pushes
+    bb = double_push
+    while bb:
+        lsb = bb & -bb
+        to_sq = lsb.bit_length() - 1
+        bb &= bb - 1
+        
+        from_sq = to_sq - (2 * direction)
+        moves[count] = _pack(from_sq, to_sq, DOUBLE_PUSH)
+        count += 1
+
+    enemy &= target_mask
+    if not enemy: return count
 
     # captures
     bb = pawns
@@ -114,114 +320,144 @@ def _gen_pawn_moves(state: State, moves: List[int], pawn_key: int, colour: bool,
             attacks &= attacks - 1
             
             if (colour == WHITE and to_sq >= promotion_rank) or (colour == BLACK and to_sq <= promotion_rank):
-                _add_promotions(moves, from_sq, to_sq, True)
+                count = _add_promotions(moves, count, from_sq, to_sq, True)
             else:
-                moves.append(_pack(from_sq, to_sq, CAPTURE))
-        
-        if state.en_passant_square != NULL:
-            if attack_table[from_sq] & SQUARE_TO_BB[state.en_passant_square]:
-                moves.append(_pack(from_sq, state.en_passant_square, EN_PASSANT))
+                moves[count] = _pack(from_sq, to_sq, CAPTURE)
+                count += 1
+
+    return count
+
+def _gen_en_passant(state: State, moves: List[int], count: int, pawns: int, attack_table: List[int]):
+    ep_square = state.en_passant_square
+    if ep_square == NULL: return count
+
+    bb = pawns
+    while bb:
+        lsb = bb & -bb
+        from_sq = lsb.bit_length() - 1
+        bb &= bb - 1
 
-def _add_promotions(moves: List[int], from_sq: int, to_sq: int, is_capture: bool):
+        if attack_table[from_sq] & SQUARE_TO_BB[ep_square]:
+            moves[count] = _pack(from_sq, ep_square, EN_PASSANT)
+            count += 1
+
+    return count
+
+def _add_promotions(moves: List[int], count: int, from_sq: int, to_sq: int, is_capture: bool):
     if is_capture:
-        moves.append(_pack(from_sq, to_sq, PROMO_CAP_Q))
-        moves.append(_pack(from_sq, to_sq, PROMO_CAP_R))
-        moves.append(_pack(from_sq, to_sq, PROMO_CAP_B))
-        moves.append(_pack(from_sq, to_sq, PROMO_CAP_N))
+        moves[count] = _pack(from_sq, to_sq, PROMO_CAP_Q)
+        moves[count + 1] = _pack(from_sq, to_sq, PROMO_CAP_R)
+        moves[count + 2] = _pack(from_sq, to_sq, PROMO_CAP_B)
+        moves[count + 3] = _pack(from_sq, to_sq, PROMO_CAP_N)
     else:
-        moves.append(_pack(from_sq, to_sq, PROMOTION_Q))
-        moves.append(_pack(from_sq, to_sq, PROMOTION_R))
-        moves.append(_pack(from_sq, to_sq, PROMOTION_B))
-        moves.append(_pack(from_sq, to_sq, PROMOTION_N))
+        moves[count] = _pack(from_sq, to_sq, PROMOTION_Q)
+        moves[count + 1] = _pack(from_sq, to_sq, PROMOTION_R)
+        moves[count + 2] = _pack(from_sq, to_sq, PROMOTION_B)
+        moves[count + 3] = _pack(from_sq, to_sq, PROMOTION_N)
+    return count + 4
 
-def _gen_knight_moves(pieces: int, moves: List[int], active: int, enemy: int, captures_only: bool):
+def _gen_knight_moves(pieces: int, moves: List[int], count: int, target_mask: int, enemy: int):
     while pieces:
         lsb = pieces & -pieces
         from_sq = lsb.bit_length() - 1
         pieces &= pieces - 1
         
-        targets = KNIGHT_ATTACKS[from_sq] & ~active
-        if captures_only: targets &= enemy
+        targets = KNIGHT_ATTACKS[from_sq] & target_mask
         
         while targets:
             t_lsb = targets & -targets
             to_sq = t_lsb.bit_length() - 1
             targets &= targets - 1
             flag = CAPTURE if SQUARE_TO_BB[to_sq] & enemy else QUIET
-            moves.append(_pack(from_sq, to_sq, flag))
+            moves[count] = _pack(from_sq, to_sq, flag)
+            count += 1
+
+    return count
 
-def _gen_king_moves(pieces: int, moves: List[int], active: int, enemy: int, captures_only: bool):
+def _gen_king_moves(pieces: int, moves: List[int], count: int, target_mask: int, enemy: int):
     while pieces:
         lsb = pieces & -pieces
         from_sq = lsb.bit_length() - 1
         pieces &= pieces - 1
         
-        targets = KING_ATTACKS[from_sq] & ~active
-        if captures_only: targets &= enemy
+        targets = KING_ATTACKS[from_sq] & target_mask
         
         while targets:
             t_lsb = targets & -targets
             to_sq = t_lsb.bit_length() - 1
             targets &= targets - 1
             flag = CAPTURE if SQUARE_TO_BB[to_sq] & enemy else QUIET
-            moves.append(_pack(from_sq, to_sq, flag))
+            moves[count] = _pack(from_sq, to_sq, flag)
+            count += 1
 
-def _gen_castling_moves(state: State, moves: List[int], all_pieces: int):
+    return count
+
+def _gen_castling_moves(state: State, moves: List[int], count: int, all_pieces: int):
     opponent = BLACK if state.is_white else WHITE
     if state.is_white:
         if state.castling_rights & CASTLE_WK:
             if not (all_pieces & (SQUARE_TO_BB[F1] | SQUARE_TO_BB[G1])):
                 if not is_square_attacked(state, E1, opponent) and not is_square_attacked(state, F1, opponent) and not is_square_attacked(state, G1, opponent):
-                    moves.append(_pack(E1, G1, CASTLE_KS))
+                    moves[count] = _pack(E1, G1, CASTLE_KS)
+                    count += 1
         if state.castling_rights & CASTLE_WQ:
             if not (all_pieces & (SQUARE_TO_BB[B1] | SQUARE_TO_BB[C1] | SQUARE_TO_BB[D1])):
                 if not is_square_attacked(state, E1, opponent) and not is_square_attacked(state, D1, opponent) and not is_square_attacked(state, C1, opponent):
-                    moves.append(_pack(E1, C1, CASTLE_QS))
+                    moves[count] = _pack(E1, C1, CASTLE_QS)
+                    count += 1
     else:
         if state.castling_rights & CASTLE_BK:
             if not (all_pieces & (SQUARE_TO_BB[F8] | SQUARE_TO_BB[G8])):
                 if not is_square_attacked(state, E8, opponent) and not is_square_attacked(state, F8, opponent) and not is_square_attacked(state, G8, opponent):
-                    moves.append(_pack(E8, G8, CASTLE_KS))
+                    moves[count] = _pack(E8, G8, CASTLE_KS)
+                    count += 1
         if state.castling_rights & CASTLE_BQ:
             if not (all_pieces & (SQUARE_TO_BB[B8] | SQUARE_TO_BB[C8] | SQUARE_TO_BB[D8])):
                 if not is_square_attacked(state, E8, opponent) and not is_square_attacked(state, D8, opponent) and not is_square_attacked(state, C8, opponent):
-                    moves.append(_pack(E8, C8, CASTLE_QS))
+                    moves[count] = _pack(E8, C8, CASTLE_QS)
+                    count += 1
+
+    return count
 
-def _gen_bishop_moves(pieces: int, moves: List[int], all_pieces: int, active: int, enemy: int, captures_only: bool):
+def _gen_bishop_moves(pieces: int, moves: List[int], count: int, all_pieces: int, target_mask: int, enemy: int):
     while pieces:
         lsb = pieces & -pieces
         from_sq = lsb.bit_length() - 1
         pieces &= pieces - 1
         
         mask = BISHOP_MASKS[from_sq]
-        targets = BISHOP_TABLE[from_sq][all_pieces & mask] & ~active
-        if captures_only: targets &= enemy
+        targets = BISHOP_TABLE[from_sq][all_pieces & mask] & target_mask
         
         while targets:
             t_lsb = targets & -targets
             to_sq = t_lsb.bit_length() - 1
             targets &= targets - 1
             flag = CAPTURE if SQUARE_TO_BB[to_sq] & enemy else QUIET
-            moves.append(_pack(from_sq, to_sq, flag))
+            moves[count] = _pack(from_sq, to_sq, flag)
+            count += 1
+
+    return count
 
-def _gen_rook_moves(pieces: int, moves: List[int], all_pieces: int, active: int, enemy: int, captures_only: bool):
+def _gen_rook_moves(pieces: int, moves: List[int], count: int, all_pieces: int, target_mask: int, enemy: int):
     while pieces:
         lsb = pieces & -pieces
         from_sq = lsb.bit_length() - 1
         pieces &= pieces - 1
         
         mask = ROOK_MASKS[from_sq]
-        targets = ROOK_TABLE[from_sq][all_pieces & mask] & ~active
-        if captures_only: targets &= enemy
+        targets = ROOK_TABLE[from_sq][all_pieces & mask] & target_mask
         
         while targets:
             t_lsb = targets & -targets
             to_sq = t_lsb.bit_length() - 1
             targets &= targets - 1
             flag = CAPTURE if SQUARE_TO_BB[to_sq] & enemy else QUIET
-            moves.append(_pack(from_sq, to_sq, flag))
+            moves[count] = _pack(from_sq, to_sq, flag)
+            count += 1
 
-def _gen_queen_moves(pieces: int, moves: List[int], all_pieces: int, active: int, enemy: int, captures_only: bool):
+    return count
+
+def _gen_queen_moves(pieces: int, moves: List[int], count: int, all_pieces: int, target_mask: int, enemy: int):
     while pieces:
         lsb = pieces & -pieces
         from_sq = lsb.bit_length() - 1
@@ -229,12 +465,14 @@ def _gen_queen_moves(pieces: int, moves: List[int], all_pieces: int, active: int
         
         r_mask = ROOK_MASKS[from_sq]
         b_mask = BISHOP_MASKS[from_sq]
-        targets = (ROOK_TABLE[from_sq][all_pieces & r_mask] | BISHOP_TABLE[from_sq][all_pieces & b_mask]) & ~active
-        if captures_only: targets &= enemy
+        targets = (ROOK_TABLE[from_sq][all_pieces & r_mask] | BISHOP_TABLE[from_sq][all_pieces & b_mask]) & target_mask
         
         while targets:
             t_lsb = targets & -targets
             to_sq = t_lsb.bit_length() - 1
             targets &= targets - 1
             flag = CAPTURE if SQUARE_TO_BB[to_sq] & enemy else QUIET
-            moves.append(_pack(from_sq, to_sq, flag))
\ No newline at end of file
+            moves[count] = _pack(from_sq, to_sq, flag)
+            count += 1
+
+    return count
@@ -43,6 +43,28 @@ def is_square_attacked(state: State, sq: int, colour: bool) -> bool:
 
     return False
 
+def is_square_attacked_occ(state: State, sq: int, colour: bool, occupancy: int, exclude: int = 0) -> bool:
+    """is_square_attacked against a hypothetical occupancy, ignoring the pieces in exclude"""
+    bitboards = state.bitboards
+    
+    if colour == WHITE:
+        P, N, B, R, Q, K = WHITE_PIECES
+        pawn_attacks = BLACK_PAWN_ATTACKS[sq]
+    else:
+        P, N, B, R, Q, K = BLACK_PIECES
+        pawn_attacks = WHITE_PAWN_ATTACKS[sq]
+
+    keep = ~exclude
+    if pawn_attacks & bitboards[P] & keep: return True
+    if KNIGHT_ATTACKS[sq] & bitboards[N] & keep: return True
+    if KING_ATTACKS[sq] & bitboards[K]: return True
+
+    queens = bitboards[Q] & keep
+    if BISHOP_TABLE[sq][occupancy & BISHOP_MASKS[sq]] & ((bitboards[B] & keep) | queens): return True
+    if ROOK_TABLE[sq][occupancy & ROOK_MASKS[sq]] & ((bitboards[R] & keep) | queens): return True
+
+    return False
+
 def get_attackers(state: State, sq: int, colour: bool) -> int:
     """Get all pieces of 'colour' that attack the given square"""
     attackers = 0
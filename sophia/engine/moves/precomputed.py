@@ -1,4 +1,5 @@
 from typing import List
+import multiprocessing as mp
 from engine.core.constants import (
     WHITE, BLACK,
     FILE_A, FILE_H, FILE_AB, FILE_GH,
@@ -18,6 +19,9 @@ BISHOP_TABLE: List[List[int]] = []
 ROOK_MASKS: List[int] = [0] * 64
 BISHOP_MASKS: List[int] = [0] * 64
 
+# [from][to] squares strictly between two aligned squares, 0 if they share no line
+BETWEEN: List[List[int]] = [[0] * 64 for _ in range(64)]
+
 def generate_knight_attacks(square: int) -> int:
     attacks = 0
     bb = 1 << square
@@ -117,5 +121,17 @@ def init_tables():
 
     return BISHOP_TABLE, ROOK_TABLE
 
+def init_between():
+    # a ray from a stopped at b, intersected with the ray from b stopped at a
+    for a in range(64):
+        for b in range(64):
+            a_bb, b_bb = SQUARE_TO_BB[a], SQUARE_TO_BB[b]
+            if ROOK_TABLE[a][0] & b_bb:
+                BETWEEN[a][b] = ROOK_TABLE[a][b_bb & ROOK_MASKS[a]] & ROOK_TABLE[b][a_bb & ROOK_MASKS[b]]
+            elif BISHOP_TABLE[a][0] & b_bb:
+                BETWEEN[a][b] = BISHOP_TABLE[a][b_bb & BISHOP_MASKS[a]] & BISHOP_TABLE[b][a_bb & BISHOP_MASKS[b]]
+
 BISHOP_TABLE, ROOK_TABLE = init_tables()
-send_info_string('initialised lookup tables')
\ No newline at end of file
+init_between()
+# lazy smp helpers import this before they can silence stdout, only the main process talks to the GUI
+if mp.current_process().name == 'MainProcess': send_info_string('initialised lookup tables')
\ No newline at end of file
@@ -1,3 +1,7 @@
+from array import array
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
 from engine.core.constants import (
     WHITE, BLACK,
     FILE_A, INFINITY, PIECE_VALUES,
@@ -12,7 +16,9 @@ from engine.core.constants import (
     KING_TO_CENTRE_BONUS, KING_TO_ENEMY_PAWNS_BONUS,
     BISHOP_PAIR_BONUS, ROOK_OPEN_FILE, ROOK_SEMI_OPEN_FILE,
     KNIGHT_MOBILITY, BISHOP_MOBILITY, ROOK_MOBILITY, QUEEN_MOBILITY,
-    WINNING_THRESHOLD, LOSING_THRESHOLD, TRADE_BONUS_PER_PIECE, TRADE_PENALTY_PER_PIECE
+    WINNING_THRESHOLD, LOSING_THRESHOLD, TRADE_BONUS_PER_PIECE, TRADE_PENALTY_PER_PIECE,
+    SCALE_NORMAL, SCALE_DRAW,
+    LAZY_MARGIN_PAWNS, LAZY_MARGIN_PIECES
 )
 from engine.moves.precomputed import (
     KNIGHT_ATTACKS, KING_ATTACKS,
@@ -42,6 +48,10 @@ ADJACENT_FILE_MASKS = [0] * 8
 KNIGHT_OUTPOST_MASKS_W = [0] * 64
 KNIGHT_OUTPOST_MASKS_B = [0] * 64
 
+# material signature: a 4-bit count per piece code, exact, and updated by adding / subtracting deltas
+MATERIAL_PIECES = (WP, WN, WB, WR, WQ, BP, BN, BB, BR, BQ)
+MATERIAL_DELTA = [1 << (4 * piece) if piece in MATERIAL_PIECES else 0 for piece in range(16)]
+
 class PawnHashTable:
     def __init__(self, size_mb=16):
         total_bytes = size_mb * 1024 * 1024
@@ -59,6 +69,73 @@ class PawnHashTable:
         idx = pawn_hash % self.size
         self.table[idx] = (pawn_hash, score)
 
+    def clear(self):
+        self.table = [None] * self.size
+
+class EvalHashTable:
+    """Static evals by position hash: index with the low bits, verify the whole key"""
+    def __init__(self, size_mb=8):
+        entries = max(1, (size_mb * 1024 * 1024) // 16) # key + score, 8 bytes each
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = array('Q', bytes(self.size * 8))
+        self.scores = array('q', bytes(self.size * 8))
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key):
+        self.probes += 1
+        idx = key & self.mask
+        if self.keys[idx] == key:
+            self.hits += 1
+            return self.scores[idx]
+        return None
+
+    def store(self, key, score):
+        idx = key & self.mask
+        self.keys[idx] = key
+        self.scores[idx] = score
+
+    def clear(self):
+        self.keys = array('Q', bytes(self.size * 8))
+        self.scores = array('q', bytes(self.size * 8))
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+
+    def get_hit_rate(self) -> int:
+        """Hits per mille of probes since the last reset"""
+        return self.hits * 1000 // self.probes if self.probes else 0
+
+@dataclass(slots=True)
+class MaterialEntry:
+    key: int # material signature
+    phase: int # middlegame phase, capped at MAX_PHASE
+    imbalance: int # material-only bonus from white's point of view (bishop pair)
+    simplification: int # pieces traded off, drives the trading bonus
+    is_draw: bool # nobody can win wherever the pieces stand (insufficient material, KNNK)
+    draw_check: Optional[Callable] = None # dead draw depending on the squares (bishops on one colour)
+    scale: Optional[Callable] = None # eval scale factor out of SCALE_NORMAL (wrong rook-pawn bishop)
+
+class MaterialHashTable:
+    """Everything that depends on material alone, keyed by the material signature"""
+    def __init__(self, size=8192):
+        self.size = size
+        self.table = [None] * self.size
+
+    def probe(self, material_key) -> MaterialEntry:
+        """Entry for this material signature, computed and stored on a miss"""
+        idx = material_key % self.size
+        entry = self.table[idx]
+        if entry is None or entry.key != material_key:
+            entry = compute_material(material_key)
+            self.table[idx] = entry
+        return entry
+
+    def clear(self):
+        self.table = [None] * self.size
+
 def init_eval_tables():
     piece_type_map = {
         PAWN: (PAWN, MG_VALUES[PAWN], EG_VALUES[PAWN], PHASE_INC[PAWN]),
@@ -157,7 +234,7 @@ def calculate_initial_passed_pawns(state):
     return w_passed, b_passed
 
 def get_pawn_hash(state):
-    """Compute hash from pawn positions only for caching pawn structure evaluation"""
+    """Compute hash from pawn positions only, make_move keeps state.pawn_hash up to date from here"""
     h = 0
     w_pawns = state.bitboards[WP]
     b_pawns = state.bitboards[BP]
@@ -176,11 +253,73 @@ def get_pawn_hash(state):
     
     return h
 
+def get_material_key(state):
+    """Compute the material signature from piece counts, make_move keeps state.material_key up to date from here"""
+    return sum(state.piece_counts[piece] * MATERIAL_DELTA[piece] for piece in MATERIAL_PIECES)
+
+def compute_material(material_key) -> MaterialEntry:
+    count = [(material_key >> (4 * piece)) & 0xF for piece in range(16)]
+
+    phase = min(sum(count[piece] * PHASE_WEIGHTS[piece] for piece in MATERIAL_PIECES), MAX_PHASE)
+
+    imbalance = 0
+    if count[WB] >= 2: imbalance += BISHOP_PAIR_BONUS
+    if count[BB] >= 2: imbalance -= BISHOP_PAIR_BONUS
+
+    w_minors, b_minors = count[WN] + count[WB], count[BN] + count[BB]
+    w_majors, b_majors = count[WR] + count[WQ], count[BR] + count[BQ]
+    simplification = 24 - (w_minors + w_majors + b_minors + b_majors)
+
+    entry = MaterialEntry(material_key, phase, imbalance, simplification, False)
+
+    if count[WP] or count[BP] or w_majors or b_majors:
+        # king, bishop and rook pawns against a bare king
+        if not b_minors and not b_majors and not count[BP] and count[WB] == 1 and not count[WN] and not w_majors:
+            entry.scale = _wrong_bishop_white
+        elif not w_minors and not w_majors and not count[WP] and count[BB] == 1 and not count[BN] and not b_majors:
+            entry.scale = _wrong_bishop_black
+        return entry
+
+    # only kings and minors from here
+    if w_minors + b_minors <= 1: entry.is_draw = True
+    elif (count[WN] == 2 and not b_minors) or (count[BN] == 2 and not w_minors): entry.is_draw = True # KNNK
+    elif count[WB] == 1 and count[BB] == 1 and not count[WN] and not count[BN]: entry.draw_check = _bishops_on_one_colour
+
+    return entry
+
+def _bishops_on_one_colour(state):
+    w_bishop_sq = (state.bitboards[WB] & -state.bitboards[WB]).bit_length() - 1
+    b_bishop_sq = (state.bitboards[BB] & -state.bitboards[BB]).bit_length() - 1
+    return (w_bishop_sq // 8 + w_bishop_sq % 8) % 2 == (b_bishop_sq // 8 + b_bishop_sq % 8) % 2
+
+def _wrong_bishop(state, colour):
+    """Draw if every pawn is on one rook file, the bishop can't control the queening square and the defending king holds the corner"""
+    bitboards = state.bitboards
+    pawns = bitboards[WP if colour == WHITE else BP]
+
+    if not (pawns & ~FILE_MASKS[0]): file = 0
+    elif not (pawns & ~FILE_MASKS[7]): file = 7
+    else: return SCALE_NORMAL
+
+    queening_sq = file + (56 if colour == WHITE else 0)
+    bishops = bitboards[WB if colour == WHITE else BB]
+    bishop_sq = (bishops & -bishops).bit_length() - 1
+    if (bishop_sq // 8 + bishop_sq % 8) % 2 == (queening_sq // 8 + queening_sq % 8) % 2: return SCALE_NORMAL
+
+    king = bitboards[BK if colour == WHITE else WK]
+    king_sq = (king & -king).bit_length() - 1
+    if max(abs(king_sq // 8 - queening_sq // 8), abs(king_sq % 8 - queening_sq % 8)) <= 1: return SCALE_DRAW
+
+    return SCALE_NORMAL
+
+def _wrong_bishop_white(state): return _wrong_bishop(state, WHITE)
+def _wrong_bishop_black(state): return _wrong_bishop(state, BLACK)
+
 def _evaluate_pawn_structure_cached(state, w_pawns, b_pawns, pawn_hash_table):
     """Evaluate pawn structure with hash table caching"""
     
-    # compute pawn-only hash
-    pawn_hash = get_pawn_hash(state)
+    # pawn-only hash, maintained incrementally
+    pawn_hash = state.pawn_hash
     
     # try to retrieve from cache
     if pawn_hash_table:
@@ -254,18 +393,10 @@ def get_mop_up_score(state, winning_colour):
 
     return mop_up if winning_colour == WHITE else -mop_up
 
-def evaluate_trading_bonus(state, base_eval):
+def evaluate_trading_bonus(simplification_level, base_eval):
     if LOSING_THRESHOLD <= base_eval <= WINNING_THRESHOLD:
         return 0
     
-    w_pieces = (state.bitboards[WN].bit_count() + state.bitboards[WB].bit_count() + 
-                state.bitboards[WR].bit_count() + state.bitboards[WQ].bit_count())
-    b_pieces = (state.bitboards[BN].bit_count() + state.bitboards[BB].bit_count() + 
-                state.bitboards[BR].bit_count() + state.bitboards[BQ].bit_count())
-    
-    total_pieces = w_pieces + b_pieces
-    simplification_level = 24 - total_pieces
-    
     if base_eval > WINNING_THRESHOLD:
         return simplification_level * TRADE_BONUS_PER_PIECE
     elif base_eval < LOSING_THRESHOLD:
@@ -324,8 +455,31 @@ def evaluate_king_endgame_activity(king_sq, enemy_pawns):
     
     return centralisation_bonus + proximity_bonus
     
-def evaluate(state, pawn_hash_table=None):
-    mg_phase = min(state.phase, MAX_PHASE)
+def _lazy_bounds(state, evaluation, margin, simplification):
+    """Side to move (lowest, highest) final eval, the trading bonus only ever pushes a score further the same way"""
+    lowest = evaluation - margin
+    highest = evaluation + margin
+    lowest += evaluate_trading_bonus(simplification, lowest)
+    highest += evaluate_trading_bonus(simplification, highest)
+    return (lowest, highest) if state.is_white else (-highest, -lowest)
+
+def evaluate(state, pawn_hash_table=None, material_table=None, eval_table=None):
+    return evaluate_lazy(state, -INFINITY, INFINITY, pawn_hash_table, material_table, eval_table)[0]
+
+def evaluate_lazy(state, low, high, pawn_hash_table=None, material_table=None, eval_table=None) -> Tuple[int, bool]:
+    """Side to move eval, returns (score, exact)
+
+    Once the terms still to come cannot bring the score back inside (low, high) the rest is skipped,
+    the score is then only a bound: at least high, or at most low
+    """
+    if eval_table:
+        cached = eval_table.probe(state.hash)
+        if cached is not None: return cached, True
+
+    if material_table: material = material_table.probe(state.material_key)
+    else: material = compute_material(state.material_key)
+
+    mg_phase = material.phase
     eg_phase = MAX_PHASE - mg_phase
     
     base_score = (state.mg_score * mg_phase + state.eg_score * eg_phase) // MAX_PHASE
@@ -337,13 +491,20 @@ def evaluate(state, pawn_hash_table=None):
     b_pawns = bitboards[BP]
     
     # bishop pair
-    if bitboards[WB].bit_count() >= 2: evaluation += BISHOP_PAIR_BONUS
-    if bitboards[BB].bit_count() >= 2: evaluation -= BISHOP_PAIR_BONUS
+    evaluation += material.imbalance
 
     # pawn structure (WITH HASH TABLE CACHING)
     pawn_score = _evaluate_pawn_structure_cached(state, w_pawns, b_pawns, pawn_hash_table)
     evaluation += pawn_score
 
+    # a scaled ending can pull any score back to the draw, and king activity and mop-up are not
+    # covered by the margins, so only exit early before the endgame terms switch on
+    lazy = material.scale is None and mg_phase >= int(MAX_PHASE * 0.4)
+    if lazy:
+        lowest, highest = _lazy_bounds(state, evaluation, LAZY_MARGIN_PAWNS, material.simplification)
+        if lowest >= high: return lowest, False
+        if highest <= low: return highest, False
+
     # rook evaluation (open files, 7th rank, behind passed pawns)
     for colour, rook_piece in [(WHITE, WR), (BLACK, BR)]:
         score_adj = 0
@@ -407,6 +568,12 @@ def evaluate(state, pawn_hash_table=None):
         if b_king_sq >= 0:
             evaluation -= evaluate_king_safety_simple(b_king_sq, b_pawns)
 
+    # second chance before the mobility loops
+    if lazy:
+        lowest, highest = _lazy_bounds(state, evaluation, LAZY_MARGIN_PIECES, material.simplification)
+        if lowest >= high: return lowest, False
+        if highest <= low: return highest, False
+
     # mobility + trapped pieces (ONLY in middlegame when phase > 50%)
     if mg_phase > int(MAX_PHASE * 0.5):
         for colour, pieces in [(WHITE, [(WN, KNIGHT_MOBILITY), (WB, BISHOP_MOBILITY), (WR, ROOK_MOBILITY), (WQ, QUEEN_MOBILITY)]),
@@ -467,7 +634,7 @@ def evaluate(state, pawn_hash_table=None):
         evaluation += battery_score if colour == WHITE else -battery_score
 
     # trading behaviour
-    trading_bonus = evaluate_trading_bonus(state, evaluation)
+    trading_bonus = evaluate_trading_bonus(material.simplification, evaluation)
     evaluation += trading_bonus
 
     # endgame: king activity + mop up (only when phase < 40%)
@@ -485,5 +652,11 @@ def evaluate(state, pawn_hash_table=None):
             evaluation += get_mop_up_score(state, state.is_white)
         elif score_no_mopup < -200: 
             evaluation += get_mop_up_score(state, not state.is_white)
+
+    # recognised drawish endings
+    if material.scale: evaluation = evaluation * material.scale(state) // SCALE_NORMAL
+
+    if not state.is_white: evaluation = -evaluation
+    if eval_table: eval_table.store(state.hash, evaluation)
     
-    return evaluation if state.is_white else -evaluation
\ No newline at end of file
+    return evaluation, True
\ No newline at end of file
@@ -0,0 +1,11 @@
+from dataclasses import dataclass, field
+from typing import List
+from engine.core.constants import MAX_DEPTH
+
+@dataclass(slots=True)
+class SearchLimits:
+    depth: int = MAX_DEPTH
+    nodes: int = 0 # 0 = no node limit
+    mate: int = 0 # stop once a mate in this many moves is found
+    infinite: bool = False # search until 'stop'
+    search_moves: List[str] = field(default_factory=list) # uci strings, empty = all root moves
@@ -1,58 +1,108 @@
 from engine.core.constants import (
-    WHITE, INFINITY, NULL,
-    PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
-    MAX_DEPTH, MASK_SOURCE, PIECE_VALUES,
-    HISTORY_MAX, HISTORY_GRAVITY
+    WHITE, NULL,
+    PAWN, KING,
+    MASK_SOURCE, PIECE_VALUES,
+    HISTORY_MAX, HISTORY_AGE_SHIFT, CAPTURE_HISTORY_DIVISOR
 )
 from engine.core.move import (
     CAPTURE, EN_PASSANT, PROMOTION, 
-    SHIFT_TARGET, SHIFT_FLAG
+    SHIFT_TARGET, SHIFT_FLAG,
+    CAPTURE_FLAG, PROMO_FLAG, EP_FLAG
 )
+from engine.moves.generator import (
+    generate_legal_moves, get_pins_and_checkers,
+    is_pseudo_legal, is_legal_move
+)
+from engine.search.see import see_ge
 
 # repetition penalty for moving same piece repeatedly
 REPETITION_PENALTY = -25  # (except king)
 
+# ordering bands, plain ints so selection is a cheap comparison
+SCORE_TT = 10_000_000
+SCORE_CAPTURE = 2_000_000
+SCORE_COUNTER = 950_000
+SCORE_KILLER_1 = 900_000
+SCORE_KILLER_2 = 800_000
+SCORE_BAD_CAPTURE = -2_000_000 # captures losing material by SEE, after every quiet
+
+# anything scored below this is a losing capture
+BAD_CAPTURE_CEILING = SCORE_BAD_CAPTURE // 2
+
+TACTICAL_FLAGS = CAPTURE_FLAG | PROMO_FLAG
+
+# [victim_type << 4 | attacker_type] -> 10 * victim - attacker, victim 0 for quiet promotions
+MVV_LVA = [10 * PIECE_VALUES.get(i >> 4, 0) - PIECE_VALUES.get(i & 0xF, 0) for i in range(256)]
+
 class MoveOrdering:
     def __init__(self):
-        self.killer_moves = [[None] * 2 for _ in range(MAX_DEPTH + 2)]
-        self.history_table = [[0] * 64 for _ in range(64)]
+        self.history_table = [0] * 4096 # [from_sq * 64 + to_sq]
+        self.capture_history = [0] * 16384 # [piece << 10 | to_sq << 4 | captured_type]
+        self.continuation_history = [0] * (1 << 20) # [(prev_piece << 6 | prev_to) << 10 | piece << 6 | to_sq], shared by ply-1 and ply-2
         self.countermoves = [[None] * 64 for _ in range(64)]  # [from_sq][to_sq] -> countermove
     
-    def store_killer(self, depth, move: int):
+    def store_killer(self, killers, move: int):
+        """Killers live on the search stack, one pair per ply"""
         flag = (move >> SHIFT_FLAG) & 0xF
 
         if (flag & CAPTURE) or (flag == EN_PASSANT) or (flag & PROMOTION):
             return
 
-        if self.killer_moves[depth][0] == move: return
-        self.killer_moves[depth][1] = self.killer_moves[depth][0]
-        self.killer_moves[depth][0] = move
+        if killers[0] == move: return
+        killers[1] = killers[0]
+        killers[0] = move
     
     def store_history(self, move: int, depth):
         flag = (move >> SHIFT_FLAG) & 0xF
         if (flag & CAPTURE) or (flag == EN_PASSANT) or (flag & PROMOTION):
             return
 
-        start = move & MASK_SOURCE
-        target = (move >> SHIFT_TARGET) & MASK_SOURCE
-        
-        # butterfly history with aging
-        bonus = depth * depth
-        self.history_table[start][target] += bonus
+        index = (move & MASK_SOURCE) << 6 | (move >> SHIFT_TARGET) & MASK_SOURCE
         
-        # cap at max and apply gravity
-        if self.history_table[start][target] > HISTORY_MAX:
-            self.history_table[start][target] = HISTORY_MAX
-        
-        # age all history entries periodically
-        self._age_history()
+        # gravity: the bonus shrinks as the entry approaches HISTORY_MAX, so it never saturates
+        bonus = min(depth * depth, HISTORY_MAX)
+        entry = self.history_table[index]
+        self.history_table[index] = entry + bonus - entry * bonus // HISTORY_MAX
+    
+    def update_capture_history(self, state, best_move: int, depth, captures_tried):
+        """Reward the move that caused a cutoff if it was a capture, and penalise the captures searched before it"""
+        bonus = min(depth * depth, HISTORY_MAX)
+        board = state.board
+        table = self.capture_history
+
+        if best_move & TACTICAL_FLAGS:
+            index = _capture_index(board, best_move)
+            entry = table[index]
+            table[index] = entry + bonus - entry * bonus // HISTORY_MAX
+
+        for move in captures_tried:
+            index = _capture_index(board, move)
+            entry = table[index]
+            table[index] = entry - bonus - entry * bonus // HISTORY_MAX
     
-    def _age_history(self):
-        """Apply gravity to history scores to prevent saturation"""
-        for from_sq in range(64):
-            for to_sq in range(64):
-                if self.history_table[from_sq][to_sq] > 0:
-                    self.history_table[from_sq][to_sq] = max(0, self.history_table[from_sq][to_sq] - HISTORY_GRAVITY)
+    def update_continuation_history(self, state, best_move: int, depth, quiets_tried, continuations):
+        """Reward the quiet cutoff move after the moves one and two plies back, penalise the quiets searched before it"""
+        bonus = min(depth * depth, HISTORY_MAX)
+        board = state.board
+        table = self.continuation_history
+
+        for context in continuations:
+            if context is None: continue
+            base = context << 10
+
+            index = base | board[best_move & MASK_SOURCE] << 6 | (best_move >> SHIFT_TARGET) & MASK_SOURCE
+            entry = table[index]
+            table[index] = entry + bonus - entry * bonus // HISTORY_MAX
+
+            for move in quiets_tried:
+                index = base | board[move & MASK_SOURCE] << 6 | (move >> SHIFT_TARGET) & MASK_SOURCE
+                entry = table[index]
+                table[index] = entry - bonus - entry * bonus // HISTORY_MAX
+
+    def age_history(self):
+        """Scale history down once per search so old cutoffs fade out"""
+        self.history_table = [entry >> HISTORY_AGE_SHIFT for entry in self.history_table]
+        self.capture_history = [entry >> HISTORY_AGE_SHIFT for entry in self.capture_history]
     
     def store_countermove(self, previous_move, current_move: int):
         """Store countermove: after opponent plays previous move, we play current move"""
@@ -75,78 +125,127 @@ class MoveOrdering:
         prev_to = (previous_move >> SHIFT_TARGET) & MASK_SOURCE
         return self.countermoves[prev_from][prev_to]
     
-    def _get_mvv_lva_score(self, state, move: int):
-        start = move & MASK_SOURCE
-        target = (move >> SHIFT_TARGET) & MASK_SOURCE
-        
-        attacker = state.board[start]
-        victim = state.board[target]
-        
-        if victim == NULL: 
-            flag = (move >> SHIFT_FLAG) & 0xF
-            if flag == EN_PASSANT:
-                victim_val = PIECE_VALUES[PAWN]
+    def score_moves(self, moves, scores, count, state, tt_move, counter_move, killer_1, killer_2, cont_1=None, cont_2=None):
+        """Score the first count moves once into the parallel scores buffer"""
+        board = state.board
+        history = self.history_table
+        capture_history = self.capture_history
+        continuation_history = self.continuation_history
+        last_moved = state.last_moved_piece_sq
+
+        # continuation contexts (moves one and two plies back) as table offsets
+        base_1 = cont_1 << 10 if cont_1 is not None else None
+        base_2 = cont_2 << 10 if cont_2 is not None else None
+
+        for i in range(count):
+            move = moves[i]
+            if move == tt_move:
+                scores[i] = SCORE_TT
+                continue
+
+            start = move & MASK_SOURCE
+            target = (move >> SHIFT_TARGET) & MASK_SOURCE
+
+            # captures, en passant and promotions by MVV-LVA, nudged by how that capture has done before
+            # captures that lose material by SEE drop below the quiets
+            if move & TACTICAL_FLAGS:
+                victim = board[target]
+                if victim == NULL: victim_type = PAWN if (move & EP_FLAG) == EP_FLAG else 0
+                else: victim_type = victim & ~WHITE
+                piece = board[start]
+                band = SCORE_BAD_CAPTURE if (move & CAPTURE_FLAG) and not see_ge(state, move, 0) else SCORE_CAPTURE
+                scores[i] = (
+                    band + MVV_LVA[victim_type << 4 | (piece & ~WHITE)]
+                    + capture_history[piece << 10 | target << 4 | victim_type] // CAPTURE_HISTORY_DIVISOR
+                )
+            elif move == counter_move: scores[i] = SCORE_COUNTER
+            elif move == killer_1: scores[i] = SCORE_KILLER_1
+            elif move == killer_2: scores[i] = SCORE_KILLER_2
             else:
-                victim_val = 0
-        else:
-            victim_type = (victim & ~WHITE)
-            victim_val = PIECE_VALUES[victim_type]
-        
-        attacker_type = (attacker & ~WHITE)
-        attacker_val = PIECE_VALUES[attacker_type]
-        
-        return (10 * victim_val) - attacker_val
-    
-    def get_move_score(self, move: int, tt_move, counter_move, state, depth, killer_1, killer_2):
-        """Calculate move score for ordering"""
-        if move == tt_move: return INFINITY * 100
-        
-        flag = (move >> SHIFT_FLAG) & 0xF
-        is_cap = (flag & CAPTURE) or (flag == EN_PASSANT) or (flag & PROMOTION)
-        
-        if is_cap: return INFINITY * 10 + self._get_mvv_lva_score(state, move)
-        
-        if move == counter_move: return INFINITY * 9.5
-        if move == killer_1: return INFINITY * 9
-        if move == killer_2: return INFINITY * 8
-        
-        start = move & MASK_SOURCE
-        target = (move >> SHIFT_TARGET) & MASK_SOURCE
-        
-        base_score = self.history_table[start][target]
-        
-        # repetition penalty - discourage moving the same piece repeatedly (except kings)
-        if state.last_moved_piece_sq >= 0 and state.last_moved_piece_sq == start:
-            piece = state.board[start]
-            if piece != NULL:
-                piece_type = piece & ~WHITE
-                if piece_type != KING:
-                    base_score += REPETITION_PENALTY
-        
-        return base_score
+                score = history[start << 6 | target]
+
+                piece_to = board[start] << 6 | target
+                if base_1 is not None: score += continuation_history[base_1 | piece_to]
+                if base_2 is not None: score += continuation_history[base_2 | piece_to]
+
+                # repetition penalty - discourage moving the same piece repeatedly (except kings)
+                if start == last_moved and (board[start] & ~WHITE) != KING:
+                    score += REPETITION_PENALTY
+
+                scores[i] = score
     
     def clear(self):
-        self.killer_moves = [[None] * 2 for _ in range(MAX_DEPTH + 2)]
-        self.history_table = [[0] * 64 for _ in range(64)]
+        self.history_table = [0] * 4096
+        self.capture_history = [0] * 16384
+        self.continuation_history = [0] * (1 << 20)
         self.countermoves = [[None] * 64 for _ in range(64)]
 
+def _capture_index(board, move: int) -> int:
+    target = (move >> SHIFT_TARGET) & MASK_SOURCE
+    victim = board[target]
+    if victim == NULL: victim_type = PAWN if (move & EP_FLAG) == EP_FLAG else 0
+    else: victim_type = victim & ~WHITE
+    return board[move & MASK_SOURCE] << 10 | target << 4 | victim_type
+
 # incremental move selection (pick next best without full sort)
-def pick_next_move(moves, start_index, state, ordering, tt_move, counter, depth, k1, k2):
-    if start_index >= len(moves):
-        return -1
-    
+def pick_move(moves, scores, start_index, count):
+    """Swap the best remaining move to start_index and return it, moves are only ever scored once"""
     best_idx = start_index
-    best_score = ordering.get_move_score(moves[start_index], tt_move, counter, state, depth, k1, k2)
-    
-    # find the best move among remaining moves
-    for i in range(start_index + 1, len(moves)):
-        score = ordering.get_move_score(moves[i], tt_move, counter, state, depth, k1, k2)
-        if score > best_score:
-            best_score = score
+    best_score = scores[start_index]
+    for i in range(start_index + 1, count):
+        if scores[i] > best_score:
+            best_score = scores[i]
             best_idx = i
-    
-    # swap best move to current position
+
     if best_idx != start_index:
         moves[start_index], moves[best_idx] = moves[best_idx], moves[start_index]
+        scores[start_index], scores[best_idx] = scores[best_idx], scores[start_index]
     
-    return start_index
\ No newline at end of file
+    return moves[start_index]
+
+# staged move picker: most cut nodes fail high on the tt move or a good capture, so quiets are generated last
+def staged_moves(ss, state, ordering, tt_move, counter, k1, k2, cont_1=None, cont_2=None):
+    """Yield legal moves in stages: tt move, good captures, counter / killers, quiets, bad captures
+
+    Losing captures are left in ss.bad_captures so pruning can reuse the SEE result
+    """
+    moves, scores, bad_captures = ss.moves, ss.scores, ss.bad_captures
+    bad_captures.clear()
+    bad_scores = []
+
+    # pins and checks are worked out once and shared by every stage
+    pins = get_pins_and_checkers(state)
+
+    if tt_move is not None and is_pseudo_legal(state, tt_move) and is_legal_move(state, tt_move, pins):
+        yield tt_move
+    else:
+        tt_move = None
+
+    count = generate_legal_moves(state, moves, captures_only=True, pins=pins)
+    ordering.score_moves(moves, scores, count, state, None, None, None, None)
+    for i in range(count):
+        move = pick_move(moves, scores, i, count)
+        if scores[i] < BAD_CAPTURE_CEILING:
+            # the rest lose material, keep them (already best first) until the quiets are done
+            bad_captures.extend(moves[i:count])
+            bad_scores = scores[i:count]
+            break
+        if move != tt_move: yield move
+
+    # killers and the countermove are always quiet, but may not be playable in this position
+    tried = [tt_move]
+    for move in (counter, k1, k2):
+        if move is None or move in tried: continue
+        tried.append(move)
+        if is_pseudo_legal(state, move) and is_legal_move(state, move, pins): yield move
+
+    count = generate_legal_moves(state, moves, quiets_only=True, pins=pins)
+    ordering.score_moves(moves, scores, count, state, None, None, None, None, cont_1, cont_2)
+    for i in range(count):
+        move = pick_move(moves, scores, i, count)
+        if move not in tried: yield move
+
+    count = len(bad_captures)
+    for i in range(count):
+        move = pick_move(bad_captures, bad_scores, i, count)
+        if move != tt_move: yield move
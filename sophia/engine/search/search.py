@@ -1,14 +1,15 @@
 import time
+import threading
 from engine.core.constants import (
     WHITE, BLACK, INFINITY,
-    MAX_DEPTH, TIME_CHECK_NODES,
+    MAX_DEPTH, MAX_PLY, TIME_CHECK_NODES, EVAL_HASH_MB,
     PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
     MASK_SOURCE, NULL, PIECE_VALUES,
-    RAZOR_MARGIN, STATIC_NULL_MARGIN, FUTILITY_MARGIN,
+    RAZOR_MARGIN, STATIC_NULL_MARGIN, FUTILITY_MARGIN, RFP_MARGIN, RFP_MAX_DEPTH,
     LMR_BASE_REDUCTION, LMR_MOVE_THRESHOLD,
     LMP_BASE, LMP_MULTIPLIER,
     NMP_BASE_REDUCTION, NMP_DEPTH_REDUCTION, NMP_EVAL_MARGIN,
-    CHECK_EXTENSION,
+    CHECK_EXTENSION, QS_HISTORY_DEPTH,
     CONTEMPT, REPETITION_PENALTY_WINNING, REPETITION_PENALTY_EQUAL, 
     REPETITION_PENALTY_SLIGHT, SLIGHTLY_BETTER_THRESHOLD,
     CLEARLY_WINNING_THRESHOLD, CLEARLY_LOSING_THRESHOLD, 
@@ -18,35 +19,47 @@ from engine.core.move import (
     CAPTURE_FLAG, PROMO_FLAG, EP_FLAG,
     move_to_uci, SHIFT_TARGET
 )
-from engine.moves.generator import generate_pseudo_legal_moves
+from engine.moves.generator import get_legal_moves, generate_legal_moves, is_pseudo_legal
 from engine.board.move_exec import (
     make_move, unmake_move,
     make_null_move, unmake_null_move,
-    is_repetition, has_insufficient_material
+    is_repetition
 )
 from engine.moves.legality import is_in_check
 from engine.search.transposition import (
-    TranspositionTable,
-    FLAG_EXACT, FLAG_LOWERBOUND, FLAG_UPPERBOUND
+    TranspositionTable, SharedTranspositionTable, MappedTranspositionTable,
+    FLAG_EXACT, FLAG_LOWERBOUND, FLAG_UPPERBOUND, DEPTH_QS
 )
-from engine.search.evaluation import evaluate, PawnHashTable
-from engine.search.ordering import MoveOrdering, pick_next_move
-from engine.search.see import see_fast
+from engine.search.evaluation import evaluate, evaluate_lazy, PawnHashTable, MaterialHashTable, EvalHashTable
+from engine.search.ordering import MoveOrdering, pick_move, staged_moves, BAD_CAPTURE_CEILING
 from engine.uci.utils import send_command, send_info_string
 from engine.search.syzygy import SyzygyHandler
 from engine.search.utils import _get_cp_score
+from engine.search.smp import HelperPool
+from engine.search.time_manager import TimeManager
+from engine.search.limits import SearchLimits
+from engine.search.stack import SearchStack
+
+# the pruning in _alpha_beta only asks whether the static eval is this far below alpha or above beta
+PRUNING_LOW_MARGIN = max(RAZOR_MARGIN[-1], FUTILITY_MARGIN[-1])
+PRUNING_HIGH_MARGIN = max(RFP_MARGIN * RFP_MAX_DEPTH, STATIC_NULL_MARGIN, NMP_EVAL_MARGIN)
 
 class SearchEngine:
-    def __init__(self, time_limit=2000, tt_size_mb=64):
-        self.time_limit = time_limit
-        self.tt = TranspositionTable(tt_size_mb)
+    def __init__(self, tt_size_mb=64, tt=None):
+        self.time_manager = TimeManager()
+        self.tt_size_mb = tt_size_mb
+        self.tt = tt if tt is not None else TranspositionTable(tt_size_mb)
         self.pawn_hash = PawnHashTable(32)
+        self.material_table = MaterialHashTable()
+        self.eval_cache = EvalHashTable(EVAL_HASH_MB)
         self.syzygy = SyzygyHandler()
         self.ordering = MoveOrdering()
+        self.stack = SearchStack()
         self.nodes_searched = 0
         self.depth_reached = 0
         self.seldepth = 0
         self.tbhits = 0
+        self.node_limit = 0
         self.start_time = 0.0
         self.root_colour = WHITE
         
@@ -59,32 +72,81 @@ class SearchEngine:
         self.opponent_time_ms = 999999
         
         self.stopped = False
+        self.stop_event = threading.Event() # raised by the UCI thread on 'stop' / 'quit'
+        self.shared_stop = None # lazy smp stop signal when running as a helper process
+
+        # 'go ponder': ignore the clock until ponderhit
+        self.pondering = False
+
+        # number of principal variations reported per iteration
+        self.multipv = 1
+
+        # triangular pv table: pv_table[ply][ply:pv_length[ply]] is the line from that ply
+        self.pv_table = [[0] * MAX_PLY for _ in range(MAX_PLY)]
+        self.pv_length = [0] * MAX_PLY
+        self.root_pv = []
+        self.prev_pv = [] # previous iteration's line, searched first
+        self.follow_pv = False
+
+        # lazy smp
+        self.threads = 1
+        self.smp = None
+
+    def set_threads(self, threads):
+        """Switch between single-threaded search and Lazy SMP with 'threads - 1' helpers"""
+        if self.smp:
+            self.smp.close()
+            self.smp = None
+
+        if threads > 1:
+            if not isinstance(self.tt, SharedTranspositionTable):
+                self.tt.close()
+                self.tt = SharedTranspositionTable(self.tt_size_mb)
+            self.smp = HelperPool(threads - 1, self.tt)
+        elif isinstance(self.tt, SharedTranspositionTable):
+            self.tt.close()
+            self.tt = TranspositionTable(self.tt_size_mb)
+
+        self.threads = threads
+
+    def stop(self):
+        """Interrupt the running search, safe to call from another thread"""
+        self.stop_event.set()
+        if self.smp: self.smp.stop_search()
+
+    def ponderhit(self):
+        """The expected move was played: start the clock, keeping everything searched so far"""
+        self.time_manager.restart_clock()
+        self.pondering = False
+
+    def load_tt(self, path):
+        """Continue with a table saved by tt.save(), mapped from its file, single-threaded only"""
+        if self.threads > 1: raise ValueError("set Threads to 1 before loading a hash file")
+
+        tt = MappedTranspositionTable(path)
+        self.tt.close()
+        self.tt = tt
+
+    def close(self):
+        if self.smp: self.smp.close()
+        self.tt.close()
     
-    def _get_pv_line(self, state, max_depth=20):
-        pv_moves = []
-        undo_stack = []
-        seen_hashes = {state.hash}
-
-        for _ in range(max_depth):
-            tt_entry = self.tt.probe(state.hash)
-
-            if not tt_entry or tt_entry.best_move is None: break
-
-            move = tt_entry.best_move
-            pv_moves.append(move)
-
-            make_move(state, move)
-            undo_stack.append(move)
-
-            if state.hash in seen_hashes: break
-            seen_hashes.add(state.hash)
+    def _update_pv(self, ply, move):
+        """This ply's line becomes move followed by the child's line"""
+        child_length = self.pv_length[ply + 1]
+        line = self.pv_table[ply]
+        line[ply] = move
+        line[ply + 1:child_length] = self.pv_table[ply + 1][ply + 1:child_length]
+        self.pv_length[ply] = max(child_length, ply + 1)
+
+    def _get_root_pv(self, best_move):
+        pv = self.pv_table[0][:self.pv_length[0]]
+        if not pv or pv[0] != best_move: return [best_move]
+        return pv
+
+    def get_best_move(self, state, opp_time_ms=999999, limits=None):
+        if limits is None: limits = SearchLimits()
 
-        for move in reversed(undo_stack):
-            unmake_move(state, move)
-
-        return ' '.join(move_to_uci(m) for m in pv_moves)
-
-    def get_best_move(self, state, opp_time_ms=999999):
         syzygy_result = self.syzygy.get_best_move(state)
         if syzygy_result:
             syzygy_move, wdl, dtz = syzygy_result
@@ -108,128 +170,228 @@ class SearchEngine:
         self.nodes_searched = 0
         self.seldepth = 0
         self.tbhits = 0
+        self.eval_cache.reset_stats()
+        self.node_limit = limits.nodes
         self.start_time = time.time()
         self.root_colour = state.is_white
         
         self.stopped = False
         self.depth_reached = 0
+        self.root_pv = []
+        self.ordering.age_history()
+        self.tt.new_search()
+        self.time_manager.start()
         
         #self.aspiration_current = int((self.aspiration_min + self.aspiration_max) * 0.8)
         #self.aspiration_stability_count = 0
 
-        moves = generate_pseudo_legal_moves(state)
-        legal_moves = []
-        for move in moves:
-            make_move(state, move)
-            if not is_in_check(state, not state.is_white):
-                legal_moves.append(move)
-            unmake_move(state, move)
+        moves = self._get_root_moves(state)
         
-        if not legal_moves: return None
+        if not moves: return None
 
-        moves = legal_moves
+        if limits.search_moves:
+            moves = [m for m in moves if move_to_uci(m) in limits.search_moves] or moves
 
-        captures = []
-        quiet = []
-        for m in moves:
-            if (m & CAPTURE_FLAG) or (m & PROMO_FLAG): captures.append(m)
-            else: quiet.append(m)
-        moves = captures + quiet
+        # nothing to think about
+        if len(moves) == 1 and not self.time_manager.is_infinite(): return moves[0]
         
         best_move_so_far = moves[0]
         current_depth = 1
         current_score = 0
+
+        # never ask for more lines than there are moves
+        multipv = min(self.multipv, len(moves))
+        line_scores = [0] * multipv
+        line_pvs = [[] for _ in range(multipv)]
+
+        if self.smp: self.smp.start_search(state, self.time_manager.hard_limit if not self.pondering else float('inf'))
         
         while True:
             if best_move_so_far in moves:
                 moves.remove(best_move_so_far)
                 moves.insert(0, best_move_so_far)
-            
-            alpha = -INFINITY
-            beta = INFINITY
-            
-            if current_depth > 2:
-                alpha = current_score - self.aspiration_current
-                beta = current_score + self.aspiration_current
-                
-                best_move, score = self._search_root(state, current_depth, moves, alpha, beta)
-                
-                if self.stopped: break 
-                
-                if score <= alpha or score >= beta:
-                    send_info_string(f'aspiration failed: {self.aspiration_current}')
-                    self.aspiration_current = min(self.aspiration_current * 2, self.aspiration_max)
-                    self.aspiration_stability_count = 0
-                    
-                    alpha = current_score - self.aspiration_current
-                    beta = current_score + self.aspiration_current
-                    
-                    best_move, score = self._search_root(state, current_depth, moves, alpha, beta)
-                    
-                    if self.stopped: break
-                    
-                    if score <= alpha or score >= beta:
-                        send_info_string(f'aspiration failed again: {self.aspiration_current}')
-                        self.aspiration_stability_count = 0
-                        alpha = -INFINITY
-                        beta = INFINITY
-                        best_move, score = self._search_root(state, current_depth, moves, alpha, beta)
-                else:
-                    self.aspiration_stability_count += 1
-                    if self.aspiration_stability_count >= 3:
-                        self.aspiration_current = max(self.aspiration_min, int(self.aspiration_current * 0.8))
-                        #self.aspiration_stability_count = 0
-                        if self.aspiration_current > self.aspiration_min: send_info_string(f'aspiration tightened: {self.aspiration_current}')
-            else:
-                best_move, score = self._search_root(state, current_depth, moves, -INFINITY, INFINITY)
 
+            lines = []
+            excluded = []
+            failed_low = False
+
+            # line i searches every root move except the best moves of lines 1..i-1
+            for pv_index in range(multipv):
+                line_moves = [m for m in moves if m not in excluded]
+                is_main_line = pv_index == 0
+                self.prev_pv = line_pvs[pv_index]
+
+                best_move, score, line_failed_low = self._aspiration_search(state, current_depth, line_moves, line_scores[pv_index], is_main_line)
+
+                if self.stopped: break
+
+                if is_main_line: failed_low = line_failed_low
+                lines.append((score, best_move, self._get_root_pv(best_move)))
+                excluded.append(best_move)
+
+            # nothing completed at this depth, keep the previous iteration's move
+            if not lines: break
+
+            lines.sort(key=lambda line: line[0], reverse=True)
+            current_score, best_move_so_far, self.root_pv = lines[0]
+            
             if self.stopped: break
 
-            best_move_so_far = best_move
-            current_score = score
+            line_scores = [score for score, _, _ in lines]
+            line_pvs = [pv for _, _, pv in lines]
+            score = current_score
+            best_move = best_move_so_far
             
             self.depth_reached = current_depth
             
             elapsed = time.time() - self.start_time
             nps = int(self.nodes_searched / elapsed) if elapsed > 0 else 0
-            
-            score_str = _get_cp_score(score)
 
             hashfull = self.tt.get_hashfull()
-            pv_string = self._get_pv_line(state, current_depth)
 
-            send_command(f"info depth {current_depth} seldepth {self.seldepth} score {score_str} nodes {self.nodes_searched} nps {nps} time {int(elapsed * 1000)} hashfull {hashfull} tbhits {self.tbhits} pv {pv_string}")
+            for pv_index, (line_score, _, line_pv) in enumerate(lines, 1):
+                score_str = _get_cp_score(line_score)
+                pv_string = ' '.join(move_to_uci(m) for m in line_pv)
+                multipv_str = f" multipv {pv_index}" if multipv > 1 else ""
+
+                send_command(f"info depth {current_depth} seldepth {self.seldepth}{multipv_str} score {score_str} nodes {self.nodes_searched} nps {nps} time {int(elapsed * 1000)} hashfull {hashfull} tbhits {self.tbhits} pv {pv_string}")
 
-            if abs(score) >= INFINITY - 1000:
+            # mate in N moves is 2N - 1 plies
+            if limits.mate:
+                if INFINITY - score <= 2 * limits.mate - 1: break
+            elif abs(score) >= INFINITY - 1000:
                 break
             
-            elapsed = time.time() - self.start_time
-            elapsed = elapsed * 1000
-            if elapsed > self.time_limit * 0.8: break
+            self.time_manager.update(best_move, score, failed_low)
+            if self.time_manager.is_soft_limit_reached() and not self.pondering: break
                 
             current_depth += 1
-            if current_depth > MAX_DEPTH: break
+            if current_depth > limits.depth: break
+
+        if self.smp: self.smp.stop_search()
+
+        hit_rate = self.eval_cache.get_hit_rate()
+        send_info_string(f'eval cache: {self.eval_cache.hits}/{self.eval_cache.probes} hits ({hit_rate // 10}.{hit_rate % 10}%)')
                 
         return best_move_so_far
 
-    def _search_root(self, state, depth, moves, alpha, beta):
+    def get_ponder_move(self, state, best_move):
+        """Expected reply to best_move, taken from the PV (or the TT if the PV stops short)"""
+        if best_move is None or isinstance(best_move, str): return None
+
+        if len(self.root_pv) > 1 and self.root_pv[0] == best_move: return self.root_pv[1]
+
+        make_move(state, best_move)
+        tt_entry = self.tt.probe(state.hash)
+        ponder_move = None
+        if tt_entry and tt_entry.best_move in self._get_root_moves(state):
+            ponder_move = tt_entry.best_move
+        unmake_move(state, best_move)
+
+        return ponder_move
+
+    def search_helper(self, state, helper_id):
+        """Lazy SMP helper: silent iterative deepening that only feeds the shared TT"""
+        self.nodes_searched = 0
+        self.seldepth = 0
+        self.start_time = time.time()
+        self.root_colour = state.is_white
+        self.stopped = False
+        self.prev_pv = []
+        self.time_manager.start()
+
+        moves = self._get_root_moves(state)
+        if not moves: return
+
+        # odd helpers run one ply ahead so threads spread over different depths
+        current_depth = 1 + (helper_id & 1)
+        while current_depth <= MAX_DEPTH:
+            best_move, _ = self._search_root(state, current_depth, moves, -INFINITY, INFINITY)
+            if self.stopped: break
+            self.prev_pv = self._get_root_pv(best_move)
+            current_depth += 1
+
+    def _get_root_moves(self, state):
+        legal_moves = get_legal_moves(state)
+
+        captures = []
+        quiet = []
+        for m in legal_moves:
+            if (m & CAPTURE_FLAG) or (m & PROMO_FLAG): captures.append(m)
+            else: quiet.append(m)
+        return captures + quiet
+
+    def _aspiration_search(self, state, depth, moves, previous_score, is_main_line=True):
+        """Root search in a window around the previous score, widening on failure; returns (move, score, failed_low)"""
+        if depth <= 2:
+            best_move, score = self._search_root(state, depth, moves, -INFINITY, INFINITY, is_main_line)
+            return best_move, score, False
+
+        failed_low = False
+        alpha = previous_score - self.aspiration_current
+        beta = previous_score + self.aspiration_current
+        
+        best_move, score = self._search_root(state, depth, moves, alpha, beta, is_main_line)
+        
+        if self.stopped: return best_move, score, failed_low
+        
+        if score <= alpha or score >= beta:
+            failed_low = score <= alpha
+
+            # secondary multipv lines skip straight to a full window and leave the adaptive width alone
+            if not is_main_line:
+                best_move, score = self._search_root(state, depth, moves, -INFINITY, INFINITY, is_main_line)
+                return best_move, score, failed_low
+
+            send_info_string(f'aspiration failed: {self.aspiration_current}')
+            self.aspiration_current = min(self.aspiration_current * 2, self.aspiration_max)
+            self.aspiration_stability_count = 0
+            
+            alpha = previous_score - self.aspiration_current
+            beta = previous_score + self.aspiration_current
+            
+            best_move, score = self._search_root(state, depth, moves, alpha, beta, is_main_line)
+            
+            if self.stopped: return best_move, score, failed_low
+            
+            if score <= alpha or score >= beta:
+                failed_low = failed_low or score <= alpha
+                send_info_string(f'aspiration failed again: {self.aspiration_current}')
+                self.aspiration_stability_count = 0
+                best_move, score = self._search_root(state, depth, moves, -INFINITY, INFINITY, is_main_line)
+        elif is_main_line:
+            self.aspiration_stability_count += 1
+            if self.aspiration_stability_count >= 3:
+                self.aspiration_current = max(self.aspiration_min, int(self.aspiration_current * 0.8))
+                #self.aspiration_stability_count = 0
+                if self.aspiration_current > self.aspiration_min: send_info_string(f'aspiration tightened: {self.aspiration_current}')
+
+        return best_move, score, failed_low
+
+    def _search_root(self, state, depth, moves, alpha, beta, store_tt=True):
         tt_entry = self.tt.probe(state.hash)
         tt_move = tt_entry.best_move if tt_entry else None
         
-        k1 = self.ordering.killer_moves[depth][0]
-        k2 = self.ordering.killer_moves[depth][1]
+        ply = 0
+        ss = self.stack[ply]
+        k1, k2 = ss.killers
         counter = self.ordering.get_countermove(None)
 
         best_move = moves[0]
         best_value = -INFINITY * 10
-        ply = 0
+        move_count = len(moves)
+        scores = [0] * move_count
+        self.ordering.score_moves(moves, scores, move_count, state, tt_move, counter, k1, k2)
         
-        for i in range(len(moves)):
-            pick_next_move(moves, i, state, self.ordering, tt_move, counter, depth, k1, k2)
-            move = moves[i]
+        for i in range(move_count):
+            move = pick_move(moves, scores, i, move_count)
+            ss.current_move = move
+            ss.continuation = state.board[move & MASK_SOURCE] << 6 | (move >> SHIFT_TARGET) & MASK_SOURCE
             
             make_move(state, move)
 
+            self.follow_pv = bool(self.prev_pv) and move == self.prev_pv[0]
+
             if i == 0:
                 value = -self._alpha_beta(state, depth - 1, -beta, -alpha, ply + 1, move, is_pv=True)
             else:
@@ -246,18 +408,42 @@ class SearchEngine:
             if value > best_value:
                 best_value = value
                 best_move = move
+                self._update_pv(ply, move)
                 
             if value > alpha:
                 alpha = value
                 if alpha >= beta: return best_move, alpha
 
-        if not self.stopped:
+        # a multipv line with moves excluded must not overwrite the root's real best move
+        if not self.stopped and store_tt:
             self.tt.store(state.hash, depth, best_value, FLAG_EXACT, best_move)
             
         return best_move, best_value
 
+    def _static_eval(self, state, tt_entry):
+        """Static eval, taken from the TT entry when this position has been evaluated before"""
+        if tt_entry and tt_entry.static_eval is not None: return tt_entry.static_eval
+        return evaluate(state, self.pawn_hash, self.material_table, self.eval_cache)
+
+    def _lazy_eval(self, state, tt_entry, low, high):
+        """Static eval for a cut decision against (low, high), returns (score, exact)"""
+        if tt_entry and tt_entry.static_eval is not None: return tt_entry.static_eval, True
+        return evaluate_lazy(state, low, high, self.pawn_hash, self.material_table, self.eval_cache)
+
     def _alpha_beta(self, state, depth, alpha, beta, ply, previous_move=None, allow_null=True, is_pv=False):
         if self.stopped: return 0
+        if self.stop_event.is_set():
+            self.stopped = True
+            return 0
+
+        if ply >= MAX_PLY - 1: return evaluate(state, self.pawn_hash, self.material_table, self.eval_cache)
+
+        self.pv_length[ply] = ply
+        ss = self.stack[ply]
+
+        # only the node reached by playing the previous pv from the root may follow it
+        following_pv = self.follow_pv
+        self.follow_pv = False
 
         if ply > self.seldepth: self.seldepth = ply
 
@@ -275,15 +461,22 @@ class SearchEngine:
             if beta <= mated_value:
                 return mated_value
 
+        if self.node_limit and self.nodes_searched >= self.node_limit:
+            self.stopped = True
+            return 0
+
         if (self.nodes_searched & TIME_CHECK_NODES) == 0:
-            if time.time() - self.start_time > self.time_limit / 1000.0: 
+            if (not self.pondering and self.time_manager.is_hard_limit_reached()) or (self.shared_stop and self.shared_stop.is_set()):
                 self.stopped = True
                 return 0
         
+        # probed once up front, its cached static eval serves every evaluation at this node
+        tt_entry = self.tt.probe(state.hash)
+
         is_threefold, is_fivefold = is_repetition(state)
 
         if is_threefold or is_fivefold:
-            static_eval = evaluate(state, self.pawn_hash)
+            static_eval = self._static_eval(state, tt_entry)
             
             # fivefold is automatic draw by FIDE rules
             if is_fivefold:
@@ -310,7 +503,7 @@ class SearchEngine:
 
         # 50-move rule with SCALED contempt
         if state.halfmove_clock >= FIFTY_MOVE_SCALE_START:
-            static_eval = evaluate(state, self.pawn_hash)
+            static_eval = self._static_eval(state, tt_entry)
             
             if state.halfmove_clock >= 100:
                 # at 100 moves, respect the rule
@@ -333,9 +526,10 @@ class SearchEngine:
                 else:
                     return -scaled_contempt
 
-        # insufficient material
-        if has_insufficient_material(state):
-            static_eval = evaluate(state, self.pawn_hash)
+        # insufficient material and other dead draws, one material table lookup
+        material = self.material_table.probe(state.material_key)
+        if material.is_draw or (material.draw_check and material.draw_check(state)):
+            static_eval = self._static_eval(state, tt_entry)
             if static_eval > SLIGHTLY_BETTER_THRESHOLD:
                 return -CONTEMPT
             return 0
@@ -355,8 +549,8 @@ class SearchEngine:
                 self.tt.store(state.hash, depth, score, FLAG_EXACT, None)
                 return score
 
-        tt_entry = self.tt.probe(state.hash)
-        if tt_entry and tt_entry.depth >= depth:
+        # no cutoffs on pv nodes so the pv table always holds the full line
+        if tt_entry and tt_entry.depth >= depth and not is_pv:
             if tt_entry.flag == FLAG_EXACT: return tt_entry.score
             elif tt_entry.flag == FLAG_LOWERBOUND: alpha = max(alpha, tt_entry.score)
             elif tt_entry.flag == FLAG_UPPERBOUND: beta = min(beta, tt_entry.score)
@@ -375,9 +569,13 @@ class SearchEngine:
             reduced_depth = depth - 2
             self._alpha_beta(state, reduced_depth, alpha, beta, ply, previous_move, allow_null=True, is_pv=True)
             tt_entry = self.tt.probe(state.hash)
+            self.pv_length[ply] = ply
 
-        # get static eval for pruning decisions
-        static_eval = evaluate(state, self.pawn_hash) if not in_check else 0
+        # get static eval for pruning decisions, outside pv nodes only the margins below matter
+        if in_check: static_eval, exact = 0, False
+        elif is_pv: static_eval, exact = self._static_eval(state, tt_entry), True
+        else: static_eval, exact = self._lazy_eval(state, tt_entry, alpha - PRUNING_LOW_MARGIN - 1, beta + PRUNING_HIGH_MARGIN + 1)
+        tt_eval = static_eval if exact else None
 
         # razoring (depth 1-3)
         if not is_pv and not in_check and depth <= 3 and allow_null:
@@ -387,8 +585,8 @@ class SearchEngine:
                     return razor_score
 
         # reverse futility pruning
-        if not is_pv and not in_check and depth <= 3 and allow_null:
-            rfp_margin = 120 * depth
+        if not is_pv and not in_check and depth <= RFP_MAX_DEPTH and allow_null:
+            rfp_margin = RFP_MARGIN * depth
             if static_eval - rfp_margin >= beta:
                 return static_eval - rfp_margin
 
@@ -399,6 +597,8 @@ class SearchEngine:
 
         # adaptive null move pruning
         if allow_null and depth >= 3 and not in_check and not is_pv:
+            ss.current_move = None
+            ss.continuation = None
             make_null_move(state)
 
             # adaptive reduction
@@ -420,28 +620,33 @@ class SearchEngine:
                 if static_eval + futility_margin < alpha:
                     do_futility = True
 
-        moves = generate_pseudo_legal_moves(state)
-
         tt_move = tt_entry.best_move if tt_entry else None
-        k1 = self.ordering.killer_moves[depth][0]
-        k2 = self.ordering.killer_moves[depth][1]
+
+        pv_move = None
+        if following_pv and ply < len(self.prev_pv) and is_pseudo_legal(state, self.prev_pv[ply]):
+            pv_move = tt_move = self.prev_pv[ply]
+
+        k1, k2 = ss.killers
         counter = self.ordering.get_countermove(previous_move)
+        cont_1 = self.stack[ply - 1].continuation if ply >= 1 else None
+        cont_2 = self.stack[ply - 2].continuation if ply >= 2 else None
         
         best_value = -INFINITY * 10
         best_move = None
         legal_moves_count = 0
+        captures_tried = []
+        quiets_tried = []
         
         time_pressure_mode = (self.opponent_time_ms < 10000 and abs(best_value) < 100)
         
-        for i in range(len(moves)):
-            pick_next_move(moves, i, state, self.ordering, tt_move, counter, depth, k1, k2)
-            move = moves[i]
+        for move in staged_moves(ss, state, self.ordering, tt_move, counter, k1, k2, cont_1, cont_2):
+            ss.current_move = move
+            ss.continuation = state.board[move & MASK_SOURCE] << 6 | (move >> SHIFT_TARGET) & MASK_SOURCE
             
-            make_move(state, move)
+            # SEE result cached by the move picker
+            losing_capture = depth <= 6 and move in ss.bad_captures
             
-            if is_in_check(state, not state.is_white):
-                unmake_move(state, move)
-                continue
+            make_move(state, move)
             
             legal_moves_count += 1
             
@@ -464,12 +669,12 @@ class SearchEngine:
                     continue
             
             # SEE pruning
-            if (move & CAPTURE_FLAG) and depth <= 6 and not gives_check:
-                if not see_fast(state, move, threshold=0):
-                    unmake_move(state, move)
-                    continue
+            if losing_capture and not gives_check:
+                unmake_move(state, move)
+                continue
             
             needs_full = True
+            self.follow_pv = pv_move is not None and move == pv_move
 
             # late move reduction
             if depth >= 3 and legal_moves_count >= LMR_MOVE_THRESHOLD and not is_interesting and not in_check and not gives_check:
@@ -500,17 +705,25 @@ class SearchEngine:
             unmake_move(state, move)
 
             if value >= beta:
-                self.tt.store(state.hash, depth, beta, FLAG_LOWERBOUND, move)
-                self.ordering.store_killer(depth, move)
+                self.tt.store(state.hash, depth, beta, FLAG_LOWERBOUND, move, tt_eval)
+                self.ordering.store_killer(ss.killers, move)
                 self.ordering.store_history(move, depth)
                 self.ordering.store_countermove(previous_move, move)
+                self.ordering.update_capture_history(state, move, depth, captures_tried)
+                if not (move & (CAPTURE_FLAG | PROMO_FLAG)):
+                    self.ordering.update_continuation_history(state, move, depth, quiets_tried, (cont_1, cont_2))
                 return beta
+
+            if move & (CAPTURE_FLAG | PROMO_FLAG): captures_tried.append(move)
+            else: quiets_tried.append(move)
             
             if value > best_value:
                 best_value = value
                 best_move = move
                 
-            if value > alpha: alpha = value
+            if value > alpha:
+                alpha = value
+                if is_pv: self._update_pv(ply, move)
 
         if legal_moves_count == 0:
             if in_check: return -INFINITY + ply
@@ -520,13 +733,28 @@ class SearchEngine:
         if best_value <= alpha: flag = FLAG_UPPERBOUND
         
         if not self.stopped:
-            self.tt.store(state.hash, depth, best_value, flag, best_move)
+            self.tt.store(state.hash, depth, best_value, flag, best_move, tt_eval)
             
         return best_value
 
     def _quiescence(self, state, alpha, beta, ply):
         self.nodes_searched += 1
         if self.stopped: return 0
+        if self.stop_event.is_set():
+            self.stopped = True
+            return 0
+
+        if ply >= MAX_PLY - 1: return evaluate(state, self.pawn_hash, self.material_table, self.eval_cache)
+
+        # most nodes are qsearch nodes, so the clock has to be checked here too
+        if self.node_limit and self.nodes_searched >= self.node_limit:
+            self.stopped = True
+            return 0
+
+        if (self.nodes_searched & TIME_CHECK_NODES) == 0:
+            if (not self.pondering and self.time_manager.is_hard_limit_reached()) or (self.shared_stop and self.shared_stop.is_set()):
+                self.stopped = True
+                return 0
 
         if ply > self.seldepth: self.seldepth = ply
 
@@ -546,51 +774,69 @@ class SearchEngine:
                 if tt_entry.score <= alpha: return tt_entry.score
 
         in_check = is_in_check(state, state.is_white)
+        original_alpha = alpha
+        tt_eval = None # only an exact stand-pat eval is cached with the result
         
         if not in_check:
-            evaluation = evaluate(state, self.pawn_hash)
+            # stand pat, reusing the eval cached with any earlier visit
+            # a lazy eval is only a bound, but then it is already past beta or the delta margin
+            delta = PIECE_VALUES[QUEEN] + PIECE_VALUES[PAWN]
+            evaluation, exact = self._lazy_eval(state, tt_entry, alpha - delta - 1, beta)
+            tt_eval = evaluation if exact else None
             
-            if evaluation >= beta: return beta
+            if evaluation >= beta:
+                self.tt.store(state.hash, DEPTH_QS, beta, FLAG_LOWERBOUND, None, tt_eval)
+                return beta
             
-            delta = PIECE_VALUES[QUEEN] + PIECE_VALUES[PAWN]
             if evaluation < alpha - delta:
+                self.tt.store(state.hash, DEPTH_QS, alpha, FLAG_UPPERBOUND, None, tt_eval)
                 return alpha
             
             if evaluation > alpha:
                 alpha = evaluation
         
-        if in_check:
-            moves = generate_pseudo_legal_moves(state, captures_only=False)
-        else:
-            moves = generate_pseudo_legal_moves(state, captures_only=True)
+        ss = self.stack[ply]
+        moves = ss.moves
+        move_count = generate_legal_moves(state, moves, captures_only=not in_check)
         
         tt_move = tt_entry.best_move if tt_entry else None
         
         legal_moves_found = False
+        best_move = None
+        captures_tried = []
+        
+        scores = ss.scores
+        self.ordering.score_moves(moves, scores, move_count, state, tt_move, None, None, None)
         
-        for i in range(len(moves)):
-            pick_next_move(moves, i, state, self.ordering, tt_move, None, 0, None, None)
-            move = moves[i]
+        for i in range(move_count):
+            move = pick_move(moves, scores, i, move_count)
             
-            if not in_check and (move & CAPTURE_FLAG):
-                if not see_fast(state, move, threshold=0):
-                    continue
+            # captures are ordered by SEE, so everything from here on loses material
+            if not in_check and scores[i] < BAD_CAPTURE_CEILING: break
             
             make_move(state, move)
             
-            if is_in_check(state, not state.is_white):
-                unmake_move(state, move)
-                continue
-            
             legal_moves_found = True
+            ss.current_move = move
             
             score = -self._quiescence(state, -beta, -alpha, ply + 1)
             unmake_move(state, move)
             
-            if score >= beta: return beta
-            if score > alpha: alpha = score
+            if self.stopped: return 0
+            
+            if score >= beta:
+                self.ordering.update_capture_history(state, move, QS_HISTORY_DEPTH, captures_tried)
+                self.tt.store(state.hash, DEPTH_QS, beta, FLAG_LOWERBOUND, move, tt_eval)
+                return beta
+            if score > alpha:
+                alpha = score
+                best_move = move
+            if move & (CAPTURE_FLAG | PROMO_FLAG): captures_tried.append(move)
         
         if in_check and not legal_moves_found:
              return -INFINITY + ply
 
+        flag = FLAG_EXACT if alpha > original_alpha else FLAG_UPPERBOUND
+        self.tt.store(state.hash, DEPTH_QS, alpha, flag, best_move, tt_eval)
+
         return alpha
\ No newline at end of file
@@ -1,8 +1,10 @@
 from engine.core.constants import (
     WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
-    PIECE_VALUES, MASK_SOURCE, SQUARE_TO_BB, NULL
+    WP, WN, WB, WR, WQ, WK,
+    BP, BN, BB, BR, BQ, BK,
+    PIECE_VALUES, MASK_SOURCE, SQUARE_TO_BB, NULL, NORTH
 )
-from engine.core.move import SHIFT_TARGET, EP_FLAG, SHIFT_FLAG
+from engine.core.move import SHIFT_TARGET, SHIFT_FLAG, EN_PASSANT
 from engine.moves.precomputed import (
     KNIGHT_ATTACKS, KING_ATTACKS,
     BISHOP_TABLE, BISHOP_MASKS,
@@ -10,125 +12,98 @@ from engine.moves.precomputed import (
     WHITE_PAWN_ATTACKS, BLACK_PAWN_ATTACKS
 )
 
-def get_smallest_attacker(state, square, colour, occupied):
+PAWN_VALUE = PIECE_VALUES[PAWN]
+KNIGHT_VALUE = PIECE_VALUES[KNIGHT]
+BISHOP_VALUE = PIECE_VALUES[BISHOP]
+ROOK_VALUE = PIECE_VALUES[ROOK]
+QUEEN_VALUE = PIECE_VALUES[QUEEN]
+KING_VALUE = PIECE_VALUES[KING]
+
+def _setup(state, move):
+    """Captured value, occupancy after the first capture and every attacker of the target square (both colours)"""
     bitboards = state.bitboards
-    
-    if colour == WHITE:
-        pieces = [
-            (PAWN, bitboards[WP], PIECE_VALUES[PAWN]),
-            (KNIGHT, bitboards[WN], PIECE_VALUES[KNIGHT]),
-            (BISHOP, bitboards[WB], PIECE_VALUES[BISHOP]),
-            (ROOK, bitboards[WR], PIECE_VALUES[ROOK]),
-            (QUEEN, bitboards[WQ], PIECE_VALUES[QUEEN]),
-            (KING, bitboards[WK], PIECE_VALUES[KING])
-        ]
-        pawn_attacks = BLACK_PAWN_ATTACKS[square]
-    else:
-        pieces = [
-            (PAWN, bitboards[BP], PIECE_VALUES[PAWN]),
-            (KNIGHT, bitboards[BN], PIECE_VALUES[KNIGHT]),
-            (BISHOP, bitboards[BB], PIECE_VALUES[BISHOP]),
-            (ROOK, bitboards[BR], PIECE_VALUES[ROOK]),
-            (QUEEN, bitboards[BQ], PIECE_VALUES[QUEEN]),
-            (KING, bitboards[BK], PIECE_VALUES[KING])
-        ]
-        pawn_attacks = WHITE_PAWN_ATTACKS[square]
-    
-    # check each piece type
-    for piece_type, piece_bb, piece_value in pieces:
-        attackers_bb = 0
-        
-        if piece_type == PAWN: attackers_bb = pawn_attacks & piece_bb & occupied
-        elif piece_type == KNIGHT: attackers_bb = KNIGHT_ATTACKS[square] & piece_bb & occupied
-        elif piece_type == KING: attackers_bb = KING_ATTACKS[square] & piece_bb & occupied
-        elif piece_type == BISHOP: attackers_bb = BISHOP_TABLE[square][occupied & BISHOP_MASKS[square]] & piece_bb & occupied
-        elif piece_type == ROOK: attackers_bb = ROOK_TABLE[square][occupied & ROOK_MASKS[square]] & piece_bb & occupied
-        elif piece_type == QUEEN:
-            b_att = BISHOP_TABLE[square][occupied & BISHOP_MASKS[square]]
-            r_att = ROOK_TABLE[square][occupied & ROOK_MASKS[square]]
-            attackers_bb = (b_att | r_att) & piece_bb & occupied
-        
-        if attackers_bb:
-            attacker_sq = (attackers_bb & -attackers_bb).bit_length() - 1
-            return attacker_sq, piece_value, piece_type
-    
-    return None, 0, None
-
-def see_full(state, move):
-    """
-    static exchange evaluation for a capture move
-    returns the net material gain/loss from the capture sequence
-    +ve = good for side making the capture
-    """
     start_sq = move & MASK_SOURCE
     target_sq = (move >> SHIFT_TARGET) & MASK_SOURCE
-    
-    attacker = state.board[start_sq]
-    victim = state.board[target_sq]
-    
-    # en passant captures
-    flag = (move >> SHIFT_FLAG) & 0xF
-    if flag == EP_FLAG:
-        victim_type = PAWN
-        victim_value = PIECE_VALUES[PAWN]
-    elif victim == NULL:
-        return 0  # not a capture
-    else:
-        victim_type = victim & ~WHITE
-        victim_value = PIECE_VALUES[victim_type]
-    
-    attacker_type = attacker & ~WHITE
-    attacker_colour = WHITE if (attacker & WHITE) else BLACK
-    attacker_value = PIECE_VALUES[attacker_type]
-    
-    # start with capturing the victim
-    gain = [victim_value]
-    
-    # simulate the capture sequence
-    occupied = (state.bitboards[WHITE] | state.bitboards[BLACK]) & ~SQUARE_TO_BB[start_sq]
-    current_attacker_value = attacker_value
-    side = not attacker_colour # opponent's turn to recapture
-    
-    # limit exchanges to prevent infinite loops
-    for depth in range(1, 10):
-        # find next smallest attacker
-        next_sq, next_value, next_type = get_smallest_attacker(state, target_sq, side, occupied)
-        
-        if next_sq is None:
-            break  # no more attackers
-        
-        # record the gain from capturing the previous attacker
-        gain.append(-gain[depth - 1] + current_attacker_value)
-        
-        # remove this attacker from occupied squares
-        occupied &= ~SQUARE_TO_BB[next_sq]
-        current_attacker_value = next_value
-        side = not side
-    
-    # minimax backwards through the gain array
-    for depth in range(len(gain) - 2, -1, -1):
-        gain[depth] = max(-gain[depth + 1], gain[depth])
-    
-    return gain[0]
-
-def see_fast(state, move, threshold=0):
-    """Fast SEE check: used for pruning decisions without full SEE calculation"""
-    target_sq = (move >> SHIFT_TARGET) & MASK_SOURCE
-    victim = state.board[target_sq]
-    
-    # handle en passant
-    flag = (move >> SHIFT_FLAG) & 0xF
-    if flag == EP_FLAG:
-        victim_value = PIECE_VALUES[PAWN]
-    elif victim == NULL:
-        return threshold <= 0  # not a capture
+
+    occupied = (bitboards[WHITE] | bitboards[BLACK]) ^ SQUARE_TO_BB[start_sq]
+
+    # exact flag: promotion captures share the en passant bits
+    if (move >> SHIFT_FLAG) == EN_PASSANT:
+        victim_value = PAWN_VALUE
+        captured_sq = target_sq - NORTH if state.board[start_sq] & WHITE else target_sq + NORTH
+        occupied ^= SQUARE_TO_BB[captured_sq]
     else:
-        victim_type = victim & ~WHITE
-        victim_value = PIECE_VALUES[victim_type]
-    
-    # quick heuristic: if victim value >= threshold, likely good
-    if victim_value >= threshold:
-        return True
-    
-    # otherwise do full SEE calculation
-    return see_full(state, move) >= threshold
\ No newline at end of file
+        victim = state.board[target_sq]
+        victim_value = PIECE_VALUES[victim & ~WHITE] if victim != NULL else 0
+        occupied &= ~SQUARE_TO_BB[target_sq]
+
+    bishops = bitboards[WB] | bitboards[BB] | bitboards[WQ] | bitboards[BQ]
+    rooks = bitboards[WR] | bitboards[BR] | bitboards[WQ] | bitboards[BQ]
+
+    attackers = (
+        (BLACK_PAWN_ATTACKS[target_sq] & bitboards[WP])
+        | (WHITE_PAWN_ATTACKS[target_sq] & bitboards[BP])
+        | (KNIGHT_ATTACKS[target_sq] & (bitboards[WN] | bitboards[BN]))
+        | (KING_ATTACKS[target_sq] & (bitboards[WK] | bitboards[BK]))
+        | (BISHOP_TABLE[target_sq][occupied & BISHOP_MASKS[target_sq]] & bishops)
+        | (ROOK_TABLE[target_sq][occupied & ROOK_MASKS[target_sq]] & rooks)
+    ) & occupied
+
+    return target_sq, victim_value, occupied, attackers, bishops, rooks
+
+def _least_valuable(bitboards, stm_attackers, colour):
+    """Cheapest attacker in stm_attackers as (bit, value, is_diagonal, is_straight)"""
+    if colour == WHITE: P, N, B, R, Q, K = WP, WN, WB, WR, WQ, WK
+    else: P, N, B, R, Q, K = BP, BN, BB, BR, BQ, BK
+
+    bb = stm_attackers & bitboards[P]
+    if bb: return bb & -bb, PAWN_VALUE, True, False
+    bb = stm_attackers & bitboards[N]
+    if bb: return bb & -bb, KNIGHT_VALUE, False, False
+    bb = stm_attackers & bitboards[B]
+    if bb: return bb & -bb, BISHOP_VALUE, True, False
+    bb = stm_attackers & bitboards[R]
+    if bb: return bb & -bb, ROOK_VALUE, False, True
+    bb = stm_attackers & bitboards[Q]
+    if bb: return bb & -bb, QUEEN_VALUE, True, True
+    return stm_attackers & bitboards[K], KING_VALUE, False, False
+
+def see_ge(state, move, threshold=0) -> bool:
+    """SEE >= threshold, exits as soon as the outcome is decided"""
+    bitboards = state.bitboards
+    target_sq, victim_value, occupied, attackers, bishops, rooks = _setup(state, move)
+
+    # even winning the victim for free does not reach the threshold
+    swap = victim_value - threshold
+    if swap < 0: return False
+
+    # even losing the moving piece keeps us above it
+    swap = PIECE_VALUES[state.board[move & MASK_SOURCE] & ~WHITE] - swap
+    if swap <= 0: return True
+
+    colour = bool(state.board[move & MASK_SOURCE] & WHITE)
+    result = 1
+
+    while True:
+        colour = not colour
+        attackers &= occupied
+        stm_attackers = attackers & bitboards[WHITE if colour else BLACK]
+        if not stm_attackers: break
+
+        bit, value, diagonal, straight = _least_valuable(bitboards, stm_attackers, colour)
+
+        # the king can only take last: if the other side still attacks, the king capture fails
+        if value == KING_VALUE:
+            if attackers & bitboards[BLACK if colour else WHITE]: break
+            result ^= 1
+            break
+
+        result ^= 1
+        swap = value - swap
+        if swap < result: break
+
+        occupied ^= bit
+        if diagonal: attackers |= BISHOP_TABLE[target_sq][occupied & BISHOP_MASKS[target_sq]] & bishops
+        if straight: attackers |= ROOK_TABLE[target_sq][occupied & ROOK_MASKS[target_sq]] & rooks
+
+    return bool(result)
@@ -0,0 +1,81 @@
+import multiprocessing as mp
+import os
+import sys
+
+from engine.search.transposition import SharedTranspositionTable
+
+# helpers re-import the engine, so use spawn on every platform (same as windows)
+CONTEXT = mp.get_context('spawn')
+
+def _helper_main(helper_id, tt_name, tt_size, tasks, results, stop_event):
+    """Entry point of a Lazy SMP helper process"""
+    # helpers never talk to the GUI
+    sys.stdout = open(os.devnull, 'w')
+
+    from engine.search.search import SearchEngine
+
+    tt = SharedTranspositionTable(name=tt_name, size=tt_size)
+    engine = SearchEngine(tt=tt)
+    engine.shared_stop = stop_event
+
+    results.put(helper_id) # ready
+
+    while True:
+        task = tasks.get()
+        if task is None: break
+
+        state, time_limit = task
+        engine.time_manager.set_fixed(time_limit)
+        engine.search_helper(state, helper_id)
+
+        results.put(helper_id) # idle again
+
+    tt.close()
+
+class HelperPool:
+    """Persistent helper processes searching the same root on a shared TT"""
+    def __init__(self, n_helpers: int, tt: SharedTranspositionTable):
+        self.n_helpers = n_helpers
+        self.stop_event = CONTEXT.Event()
+        self.results = CONTEXT.Queue()
+        self.task_queues = []
+        self.processes = []
+        self.busy = 0
+
+        for helper_id in range(n_helpers):
+            tasks = CONTEXT.Queue()
+            process = CONTEXT.Process(
+                target=_helper_main,
+                args=(helper_id, tt.name, tt.size, tasks, self.results, self.stop_event),
+                daemon=True
+            )
+            process.start()
+            self.task_queues.append(tasks)
+            self.processes.append(process)
+
+        # wait until every helper has built its tables
+        for _ in range(n_helpers): self.results.get()
+
+    def _wait_idle(self):
+        while self.busy:
+            self.results.get()
+            self.busy -= 1
+
+    def start_search(self, state, time_limit):
+        self._wait_idle()
+        self.stop_event.clear()
+
+        for tasks in self.task_queues:
+            tasks.put((state, time_limit))
+        self.busy = self.n_helpers
+
+    def stop_search(self):
+        """Signal helpers to stop, does not wait for them (next search does)"""
+        self.stop_event.set()
+
+    def close(self):
+        self.stop_search()
+        self._wait_idle()
+
+        for tasks in self.task_queues: tasks.put(None)
+        for process in self.processes: process.join(timeout=1)
@@ -0,0 +1,26 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+from engine.core.constants import MAX_PLY, MAX_MOVES
+
+@dataclass(slots=True)
+class StackEntry:
+    moves: List[int] = field(default_factory=lambda: [0] * MAX_MOVES) # reused move buffer
+    scores: List[int] = field(default_factory=lambda: [0] * MAX_MOVES) # ordering scores, parallel to moves
+    killers: List[Optional[int]] = field(default_factory=lambda: [None, None])
+    bad_captures: List[int] = field(default_factory=list) # captures losing material by SEE, filled by staged_moves
+    current_move: Optional[int] = None # move being searched from this ply
+    continuation: Optional[int] = None # moved piece << 6 | to_sq of current_move, context for continuation history
+
+class SearchStack:
+    """One preallocated entry per ply, so nodes never allocate move lists"""
+    def __init__(self, size: int = MAX_PLY):
+        self.entries = [StackEntry() for _ in range(size)]
+
+    def __getitem__(self, ply: int) -> StackEntry:
+        return self.entries[ply]
+
+    def clear(self):
+        for entry in self.entries:
+            entry.killers[0] = entry.killers[1] = None
+            entry.current_move = None
+            entry.continuation = None
@@ -0,0 +1,98 @@
+import time
+from engine.core.constants import (
+    MOVE_OVERHEAD, DEFAULT_MOVE_TIME,
+    MIN_MOVES_TO_GO, MAX_MOVES_TO_GO,
+    INCREMENT_USAGE, HARD_LIMIT_SCALE, MAX_TIME_USAGE,
+    STABILITY_SCALE,
+    SCORE_DROP_MARGIN, SCORE_DROP_SCALE,
+    SCORE_STEADY_MARGIN, SCORE_STEADY_SCALE,
+    FAIL_LOW_SCALE
+)
+
+class TimeManager:
+    """
+    Soft / hard deadlines for one search (ms)
+    soft: checked between iterations, scaled by best move stability
+    hard: checked inside the search, never exceeded
+    """
+    def __init__(self, move_overhead=MOVE_OVERHEAD):
+        self.move_overhead = move_overhead
+        self.start_time = 0.0
+
+        self.optimum = DEFAULT_MOVE_TIME
+        self.soft_limit = DEFAULT_MOVE_TIME
+        self.hard_limit = DEFAULT_MOVE_TIME
+        self.is_fixed = True # movetime: nothing to scale
+
+        self.previous_best = None
+        self.previous_score = None
+        self.stability = 0
+
+    def set_limits(self, time_left=None, increment=0, moves_to_go=None, move_time=None, moves_played=0):
+        if move_time is not None:
+            # keep at least half of the requested time when the overhead is large
+            return self.set_fixed(max(move_time // 2, move_time - self.move_overhead))
+
+        if time_left is None:
+            return self.set_fixed(DEFAULT_MOVE_TIME)
+
+        if moves_to_go: moves_to_go = min(moves_to_go, MAX_MOVES_TO_GO)
+        else: moves_to_go = max(MIN_MOVES_TO_GO, MAX_MOVES_TO_GO - moves_played)
+
+        usable = max(1, time_left - self.move_overhead)
+        
+        optimum = usable / moves_to_go + increment * INCREMENT_USAGE
+        self.hard_limit = max(1, int(min(optimum * HARD_LIMIT_SCALE, usable * MAX_TIME_USAGE)))
+        self.optimum = min(int(optimum), self.hard_limit)
+        self.soft_limit = self.optimum
+        self.is_fixed = False
+
+    def set_fixed(self, move_time):
+        self.optimum = self.soft_limit = self.hard_limit = move_time
+        self.is_fixed = True
+
+    def set_infinite(self):
+        """No clock: the search ends on 'stop', or on a depth / node / mate limit"""
+        self.set_fixed(float('inf'))
+
+    def is_infinite(self):
+        return self.hard_limit == float('inf')
+
+    def start(self):
+        self.start_time = time.time()
+        self.previous_best = None
+        self.previous_score = None
+        self.stability = 0
+
+    def restart_clock(self):
+        """ponderhit: the allocation starts now"""
+        self.start_time = time.time()
+
+    def elapsed(self):
+        return (time.time() - self.start_time) * 1000
+
+    def update(self, best_move, score, failed_low):
+        """Rescale the soft limit after a completed iteration"""
+        if self.is_fixed: return
+
+        if best_move == self.previous_best: self.stability = min(self.stability + 1, len(STABILITY_SCALE) - 1)
+        else: self.stability = 0
+
+        scale = STABILITY_SCALE[self.stability]
+
+        if self.previous_score is not None:
+            delta = score - self.previous_score
+            if delta < -SCORE_DROP_MARGIN: scale *= SCORE_DROP_SCALE
+            elif abs(delta) <= SCORE_STEADY_MARGIN: scale *= SCORE_STEADY_SCALE
+
+        if failed_low: scale *= FAIL_LOW_SCALE
+
+        self.soft_limit = min(self.hard_limit, int(self.optimum * scale))
+        self.previous_best = best_move
+        self.previous_score = score
+
+    def is_soft_limit_reached(self):
+        return self.elapsed() >= self.soft_limit
+
+    def is_hard_limit_reached(self):
+        return self.elapsed() >= self.hard_limit
@@ -1,12 +1,22 @@
+from array import array
 from dataclasses import dataclass
 from typing import Optional, Any
-import sys
+from multiprocessing import shared_memory
+import mmap
+import os
+import struct
+import tempfile
+
+from engine.core.zobrist import ZOBRIST_SEED, ZOBRIST_KEYS
 
 # flag types
 FLAG_EXACT = 0 # know the exact score
 FLAG_LOWERBOUND = 1 # alpha cutoff: score is at least this value (beta cutoff in search)
 FLAG_UPPERBOUND = 2 # beta cutoff: score is at most this value (failed low)
 
+# depth recorded for quiescence results, never replaces a main search entry
+DEPTH_QS = 0
+
 @dataclass(slots=True)
 class TTEntry:
     key: int # zobrist hash key
@@ -14,46 +24,245 @@ class TTEntry:
     score: int # evaluation
     flag: int # exact, lower, upper
     best_move: Any # the best move found
+    static_eval: Optional[int] = None # stand-pat eval, None when in check
+
+# each entry is two 64-bit words (key ^ data, data), a torn write from a concurrent store
+# fails the XOR check and reads as a miss, so the shared table needs no locking
+ENTRY_WORDS = 2
+ENTRY_BYTES = 16
+BUCKET_SIZE = 4 # entries a key may live in
+BUCKET_WORDS = BUCKET_SIZE * ENTRY_WORDS
+HASHFULL_SAMPLE = 1000
+
+# data word layout: [ generation : 8 | eval : 13 | flag : 2 | depth : 7 | score : 18 | move : 16 ]
+MOVE_MASK = 0xFFFF
+SCORE_SHIFT = 16
+SCORE_OFFSET = 1 << 17 # scores are stored unsigned
+SCORE_MASK = (1 << 18) - 1
+DEPTH_SHIFT = 34
+DEPTH_MASK = 0x7F # above MAX_DEPTH
+FLAG_SHIFT = 41
+FLAG_MASK = 0b11
+EVAL_SHIFT = 43
+EVAL_OFFSET = 1 << 12 # stored unsigned, 0 = no eval, static evals past +-40 pawns are clamped
+EVAL_MASK = 0x1FFF
+GENERATION_SHIFT = 56
+GENERATION_MASK = 0xFF # wraps after 256 searches
+
+# saved table file: header, then the raw words (entries followed by the generation word)
+# [ magic : 8s | zobrist seed : Q | zobrist check : Q | layout : Q | entries : Q ], padded so the words stay aligned
+FILE_MAGIC = b'SOPHIATT'
+FILE_HEADER = struct.Struct('<8sQQQQ')
+FILE_HEADER_BYTES = 64
+# every constant that decides where a field sits, a file written with another layout is rejected
+FILE_LAYOUT = (
+    ENTRY_WORDS | BUCKET_SIZE << 4 | SCORE_SHIFT << 8 | DEPTH_SHIFT << 16
+    | FLAG_SHIFT << 24 | EVAL_SHIFT << 32 | GENERATION_SHIFT << 40
+)
+
+# when a bucket is full the entry worth least is overwritten: its depth, less this per generation of age
+AGE_WEIGHT = 8
+EMPTY_WORTH = -(1 << 30)
+# an entry from an earlier search also drops below every current one, so it is always replaceable
+STALE_WORTH = DEPTH_MASK + 1
+
+def _entries_for(size_mb: int) -> int:
+    """Largest power-of-two number of buckets that fits in size_mb, as a count of entries"""
+    buckets = max(1, (size_mb * 1024 * 1024) // (BUCKET_SIZE * ENTRY_BYTES))
+    return (1 << (buckets.bit_length() - 1)) * BUCKET_SIZE
+
+def _pack_data(depth: int, score: int, flag: int, best_move, static_eval, generation: int) -> int:
+    move = best_move if best_move is not None else 0 # a1a1 is never a real move
+    depth = min(max(depth, 0), DEPTH_MASK)
+    # a node whose moves were all pruned reports -INFINITY * 10, which would not fit
+    score = min(max(score, 1 - SCORE_OFFSET), SCORE_OFFSET - 1)
+    if static_eval is None: packed_eval = 0
+    else: packed_eval = min(max(static_eval, 1 - EVAL_OFFSET), EVAL_OFFSET - 1) + EVAL_OFFSET
+    return (
+        move | ((score + SCORE_OFFSET) << SCORE_SHIFT) | (depth << DEPTH_SHIFT)
+        | (flag << FLAG_SHIFT) | (packed_eval << EVAL_SHIFT) | (generation << GENERATION_SHIFT)
+    )
 
-# sample entry to measure its actual size in memory
-sample_key = 0xFFFFFFFFFFFFFFFF # max 64-bit integer to assume the full size of the hash
-sample_entry = TTEntry(sample_key, 0, 0, 0, None)
-BYTES_PER_ENTRY = sys.getsizeof(sample_entry, 72) + sys.getsizeof(sample_key, 36) + 8
+def _unpack_data(key: int, data: int) -> TTEntry:
+    move = data & MOVE_MASK
+    packed_eval = (data >> EVAL_SHIFT) & EVAL_MASK
+    return TTEntry(
+        key,
+        (data >> DEPTH_SHIFT) & DEPTH_MASK,
+        ((data >> SCORE_SHIFT) & SCORE_MASK) - SCORE_OFFSET,
+        (data >> FLAG_SHIFT) & FLAG_MASK,
+        move if move else None,
+        packed_eval - EVAL_OFFSET if packed_eval else None
+    )
 
 class TranspositionTable:
+    """
+    Entries packed into a flat buffer of 64-bit words, grouped in buckets of BUCKET_SIZE
+    the word after the last entry holds the current generation
+    """
     def __init__(self, size_mb: int = 64):
         """Initialise TT with a fixed size"""
-        total_bytes = size_mb * 1024 * 1024
-        self.size = total_bytes // BYTES_PER_ENTRY
-        
-        self.table = [None] * self.size
-        self.entries_count = 0
+        self.size = _entries_for(size_mb)
+        self.words = array('Q', bytes((self.size * ENTRY_WORDS + 1) * 8))
+        self._attach()
+
+    def _attach(self):
+        self.bucket_mask = self.size // BUCKET_SIZE - 1
+        self.generation_index = self.size * ENTRY_WORDS
 
     def _get_index(self, key: int) -> int:
-        return key % self.size
+        return (key & self.bucket_mask) * BUCKET_WORDS
+
+    def new_search(self):
+        """Age every stored entry by one generation"""
+        words = self.words
+        words[self.generation_index] = (words[self.generation_index] + 1) & GENERATION_MASK
+
+    def new_game(self):
+        """Constant-time clear: earlier entries become replaceable and drop out of hashfull, clear() wipes them"""
+        self.new_search()
+
+    def store(self, key: int, depth: int, score: int, flag: int, best_move, static_eval=None):
+        words = self.words
+        base = self._get_index(key)
+        generation = words[self.generation_index]
 
-    def store(self, key: int, depth: int, score: int, flag: int, best_move):
-        index = self._get_index(key)
-        existing: Optional[TTEntry] = self.table[index]
+        target = -1
+        target_worth = 0
+        for index in range(base, base + BUCKET_WORDS, ENTRY_WORDS):
+            data = words[index + 1]
 
-        if existing is None:
-            self.entries_count += 1
+            if not data: worth = EMPTY_WORTH
+            elif words[index] ^ data == key:
+                # same position: a shallower result only replaces one from an earlier search
+                if depth < (data >> DEPTH_SHIFT) & DEPTH_MASK and (data >> GENERATION_SHIFT) == generation: return
+                if best_move is None and data & MOVE_MASK: best_move = data & MOVE_MASK
+                target = index
+                break
+            else:
+                age = (generation - (data >> GENERATION_SHIFT)) & GENERATION_MASK
+                worth = ((data >> DEPTH_SHIFT) & DEPTH_MASK) - AGE_WEIGHT * age
+                if age: worth -= STALE_WORTH
+
+            if target < 0 or worth < target_worth:
+                target = index
+                target_worth = worth
+        else:
+            # never push out something from this search worth more than the new entry, stale worth is always negative
+            if target_worth > depth: return
+
+        data = _pack_data(depth, score, flag, best_move, static_eval, generation)
+        words[target] = key ^ data
+        words[target + 1] = data
 
-        if existing is None or depth >= existing.depth:
-            self.table[index] = TTEntry(key, depth, score, flag, best_move)
-        
     def probe(self, key: int) -> Optional[TTEntry]:
-        index = self._get_index(key)
-        entry = self.table[index]
-        
-        if entry and entry.key == key: return entry
-        
+        words = self.words
+        base = self._get_index(key)
+
+        for index in range(base, base + BUCKET_WORDS, ENTRY_WORDS):
+            data = words[index + 1]
+            if data and words[index] ^ data == key: return _unpack_data(key, data)
+
         return None
-    
+
     def clear(self):
-        self.table = [None] * self.size
-        self.entries_count = 0
+        """Physically wipe every entry"""
+        self.words = array('Q', bytes(len(self.words) * 8))
+
+    def save(self, path: str):
+        """Dump the table to path, ready to be mapped back in with MappedTranspositionTable"""
+        header = FILE_HEADER.pack(FILE_MAGIC, ZOBRIST_SEED, ZOBRIST_KEYS.black_to_move, FILE_LAYOUT, self.size)
+        # written beside path and swapped in, so an old file (maybe mapped) is never truncated in place
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            os.chmod(temp_path, 0o644) # mkstemp files are owner-only
+            with os.fdopen(fd, 'wb') as file:
+                file.write(header.ljust(FILE_HEADER_BYTES, b'\0'))
+                file.write(self.words)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def close(self):
+        pass
 
     def get_hashfull(self) -> int:
-        """Returns occupancy in permill (0-1000)"""
-        return int(self.entries_count / self.size * 1000)
\ No newline at end of file
+        """Returns permill (0-1000) of entries written by the current generation, sampled from the start of the table"""
+        sample = min(HASHFULL_SAMPLE, self.size)
+        words = self.words
+        generation = words[self.generation_index]
+        used = 0
+        for i in range(sample):
+            data = words[i * ENTRY_WORDS + 1]
+            if data and data >> GENERATION_SHIFT == generation: used += 1
+        return used * 1000 // sample
+
+class SharedTranspositionTable(TranspositionTable):
+    """TT living in shared memory so that Lazy SMP helper processes all use the same table"""
+    def __init__(self, size_mb: int = 64, name: Optional[str] = None, size: int = 0):
+        """Create a new table, or attach to an existing one by name (helpers)"""
+        if name is None:
+            size = _entries_for(size_mb)
+            self.shm = shared_memory.SharedMemory(create=True, size=(size * ENTRY_WORDS + 1) * 8)
+            self.is_owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.is_owner = False
+
+        self.size = size
+        self.name = self.shm.name
+        self.words = self.shm.buf.cast('Q')
+        self._attach()
+
+    def clear(self):
+        """Physically wipe every entry"""
+        self.shm.buf[:] = bytes(self.shm.size)
+
+    def close(self):
+        self.words.release()
+        self.shm.close()
+        if self.is_owner: self.shm.unlink()
+
+class MappedTranspositionTable(TranspositionTable):
+    """TT mapped read-write from a file written by save(), so a restarted engine starts with a warm table"""
+    def __init__(self, path: str):
+        """Raises ValueError if the file was written by an incompatible build"""
+        self.file = open(path, 'r+b')
+        try:
+            header = self.file.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size: raise ValueError(f"{path} is too short to be a hash file")
+            magic, seed, check, layout, size = FILE_HEADER.unpack(header)
+            if magic != FILE_MAGIC: raise ValueError(f"{path} is not a hash file")
+            if seed != ZOBRIST_SEED or check != ZOBRIST_KEYS.black_to_move: raise ValueError(f"{path} uses different zobrist keys")
+            if layout != FILE_LAYOUT: raise ValueError(f"{path} uses a different entry layout")
+
+            expected = FILE_HEADER_BYTES + (size * ENTRY_WORDS + 1) * 8
+            self.file.seek(0, 2)
+            if self.file.tell() != expected: raise ValueError(f"{path} is truncated or padded")
+
+            self.map = mmap.mmap(self.file.fileno(), expected)
+        except (ValueError, OSError):
+            self.file.close()
+            raise
+
+        self.size = size
+        self.view = memoryview(self.map)
+        self.words = self.view[FILE_HEADER_BYTES:].cast('Q')
+        self._attach()
+
+    def clear(self):
+        """Physically wipe every entry"""
+        self.view[FILE_HEADER_BYTES:] = bytes(len(self.view) - FILE_HEADER_BYTES)
+
+    def save(self, path: str):
+        """The mapped file is already the table, saving over it only needs a flush"""
+        if os.path.exists(path) and os.path.samestat(os.stat(path), os.fstat(self.file.fileno())): self.map.flush()
+        else: super().save(path)
+
+    def close(self):
+        self.words.release()
+        self.view.release()
+        self.map.flush()
+        self.map.close()
+        self.file.close()
@@ -1,13 +1,17 @@
+import os
 import sys
 import traceback
 import time
+import threading
 
 from engine.board.fen_parser import load_from_fen
 from engine.board.move_exec import make_move, is_repetition
 from engine.moves.generator import get_legal_moves
 from engine.moves.legality import is_in_check
-from engine.core.constants import NAME, AUTHOR
+from engine.core.constants import NAME, AUTHOR, MOVE_OVERHEAD, MAX_DEPTH, EVAL_HASH_MB, MAX_EVAL_HASH_MB
 from engine.search.search import SearchEngine
+from engine.search.evaluation import EvalHashTable
+from engine.search.limits import SearchLimits
 from engine.uci.utils import send_command, send_info_string
 from engine.core.move import move_to_uci
 from engine.search.book import OpeningBook
@@ -15,13 +19,28 @@ from engine.search.book import OpeningBook
 # Import the new test suite
 from engine.uci.tests import evaluate, perft, draw, win_percentage, move_accuracy
 
+MAX_THREADS = os.cpu_count() or 1
+MAX_MULTIPV = 64
+
+# commands the input thread answers straight away, even while searching
+IMMEDIATE_COMMANDS = ('isready', 'stop', 'ponderhit', 'quit')
+
+GO_KEYWORDS = (
+    'searchmoves', 'ponder', 'wtime', 'btime', 'winc', 'binc',
+    'movestogo', 'depth', 'nodes', 'mate', 'movetime', 'infinite'
+)
+
 class UCI:
     def __init__(self):
         self.engine = SearchEngine()
         self.state = load_from_fen()
         self.book = OpeningBook()
+        self.search_thread = None
 
     def run(self):
+        # hand the GIL over to this thread quickly when input arrives mid-search
+        sys.setswitchinterval(0.0005)
+
         while True:
             try:
                 line = sys.stdin.readline()
@@ -29,7 +48,10 @@ class UCI:
                 line = line.strip()
                 if not line: continue
 
-                self.parse_input(line.split())
+                parts = line.split()
+                if parts[0] not in IMMEDIATE_COMMANDS: self.wait_for_search()
+
+                self.parse_input(parts)
                 
             except Exception:
                 send_info_string(f"error: {traceback.format_exc()}")
@@ -43,8 +65,11 @@ class UCI:
         elif command == 'isready': return send_command('readyok')
         elif command == 'ucinewgame': return self.handle_new_game()
         elif command == 'position': return self.handle_position(parts[1:])
-        elif command == 'go': return self.handle_go(parts[1:])
-        elif command == 'quit': sys.exit()
+        elif command == 'go': return self.start_search(parts[1:])
+        elif command == 'stop': return self.engine.stop()
+        elif command == 'ponderhit': return self.engine.ponderhit()
+        elif command == 'setoption': return self.handle_setoption(parts[1:])
+        elif command == 'quit': return self.handle_quit()
         
         # custom debug commands
         elif command == 'd': return draw(self.state)
@@ -53,6 +78,8 @@ class UCI:
         elif command == 'win': return win_percentage(self.state)
         elif command == 'acc': return move_accuracy(self.state, parts[1] if len(parts) > 1 else '0000')
         elif command == 'play': return self.handle_play()
+        elif command == 'savehash': return self.handle_save_hash(' '.join(parts[1:]))
+        elif command == 'loadhash': return self.handle_load_hash(' '.join(parts[1:]))
 
     def handle_play(self):
         """Self-play loop"""
@@ -71,13 +98,15 @@ class UCI:
             if threefold: send_info_string('draw: threefold repetition'); break
             elif fivefold: send_info_string('draw: fivefold repetition'); break
                 
-            uci_go = f'go wtime {int(w_time)} btime {int(b_time)}'.split()
+            uci_go = f'wtime {int(w_time)} btime {int(b_time)}'.split()
             
             is_white = self.state.is_white
             engine_time = w_time if is_white else b_time
             start_time = time.time()
             
-            result = self.parse_input(uci_go)
+            self.engine.stop_event.clear()
+            self.engine.pondering = False # a stopped 'go ponder' leaves it set
+            result = self.handle_go(uci_go)
             
             if not result or not result.startswith('bestmove'):
                 send_info_string("error: engine did not return a move")
@@ -115,19 +144,33 @@ class UCI:
 
             self.parse_input(uci_draw)
 
+    def start_search(self, args):
+        """Run 'go' on a worker thread so the input thread stays responsive"""
+        self.wait_for_search()
+        self.engine.stop_event.clear()
+        self.engine.pondering = 'ponder' in args
+
+        self.search_thread = threading.Thread(target=self.handle_go, args=(args,), daemon=True)
+        self.search_thread.start()
+
+    def wait_for_search(self):
+        if self.search_thread:
+            self.search_thread.join()
+            self.search_thread = None
+
     def handle_go(self, args):
         book_move = self.book.get_move(self.state)
         if book_move:
             send_info_string(f"found book move: {book_move}")
-            response = f'bestmove {book_move}'
-            send_command(response)
-            return response
+            return self.send_bestmove(book_move)
 
         w_time = None
         b_time = None
         w_inc = 0
         b_inc = 0
         move_time = None
+        moves_to_go = None
+        limits = SearchLimits()
 
         try:
             for i in range(len(args)):
@@ -136,39 +179,32 @@ class UCI:
                 elif args[i] == 'winc': w_inc = int(args[i + 1])
                 elif args[i] == 'binc': b_inc = int(args[i + 1])
                 elif args[i] == 'movetime': move_time = int(args[i + 1])
+                elif args[i] == 'movestogo': moves_to_go = int(args[i + 1])
+                elif args[i] == 'depth': limits.depth = max(1, min(int(args[i + 1]), MAX_DEPTH))
+                elif args[i] == 'nodes': limits.nodes = int(args[i + 1])
+                elif args[i] == 'mate': limits.mate = int(args[i + 1])
+                elif args[i] == 'infinite': limits.infinite = True
+                elif args[i] == 'searchmoves':
+                    for move_str in args[i + 1:]:
+                        if move_str in GO_KEYWORDS: break
+                        limits.search_moves.append(move_str.lower())
         except IndexError: pass
-
-        time_limit = 2000
         
         # track opponent time for time pressure tactics
         opponent_time = b_time if self.state.is_white else w_time
         if opponent_time is None: opponent_time = 999999
 
-        if move_time: 
-            time_limit = move_time
-        elif w_time is not None and b_time is not None:
-            my_time = w_time if self.state.is_white else b_time
-            my_inc = w_inc if self.state.is_white else b_inc
-            
-            # estimate remaining moves
-            moves_played = self.state.fullmove_number
-            remaining_moves_est = max(20, 50 - moves_played)
-            
-            # time allocation
-            time_limit = (my_time / remaining_moves_est) + (my_inc * 0.5)
-            
-            # panic mode: if we have less than 10 seconds, play much faster
-            if my_time < 10000:
-                time_limit = my_time / 5
-                
-            # network / execution overhead
-            overhead = 200
-            time_limit = max(overhead, time_limit - overhead)
+        my_time = w_time if self.state.is_white else b_time
+        my_inc = w_inc if self.state.is_white else b_inc
 
-        self.engine.time_limit = int(time_limit)
+        has_clock = my_time is not None or move_time is not None
+        if limits.infinite or (not has_clock and (limits.depth < MAX_DEPTH or limits.nodes or limits.mate)):
+            self.engine.time_manager.set_infinite()
+        else:
+            self.engine.time_manager.set_limits(my_time, my_inc, moves_to_go, move_time, self.state.fullmove_number)
         
         try:
-            best_move = self.engine.get_best_move(self.state, opponent_time)
+            best_move = self.engine.get_best_move(self.state, opponent_time, limits)
             
             if isinstance(best_move, str):
                 move_str = best_move
@@ -176,26 +212,85 @@ class UCI:
                 move_str = move_to_uci(best_move)
             else:
                 move_str = '0000'
-            response = f'bestmove {move_str}'
-            send_command(response)
-            return response
+
+            ponder_move = self.engine.get_ponder_move(self.state, best_move)
+            return self.send_bestmove(move_str, move_to_uci(ponder_move) if ponder_move else None, limits.infinite)
 
         except Exception as e:
             send_info_string(f"error: {e}")
             send_info_string(traceback.format_exc())
-            response = 'bestmove 0000'
-            send_command(response)
-            return response
+            return self.send_bestmove('0000', None, limits.infinite)
+
+    def send_bestmove(self, move_str, ponder_str=None, infinite=False):
+        # while pondering or in infinite mode, bestmove may only be sent after ponderhit / stop
+        while (self.engine.pondering or infinite) and not self.engine.stop_event.wait(0.001): pass
+
+        response = f'bestmove {move_str}'
+        if ponder_str: response += f' ponder {ponder_str}'
+        send_command(response)
+        return response
 
     def handle_uci(self):
         send_command(f'id name {NAME}')
         send_command(f'id author {AUTHOR}')
+        send_command(f'option name Threads type spin default 1 min 1 max {MAX_THREADS}')
+        send_command('option name Ponder type check default false')
+        send_command(f'option name MultiPV type spin default 1 min 1 max {MAX_MULTIPV}')
+        send_command(f'option name Move Overhead type spin default {MOVE_OVERHEAD} min 0 max 5000')
+        send_command(f'option name Eval Hash type spin default {EVAL_HASH_MB} min 1 max {MAX_EVAL_HASH_MB}')
+        send_command('option name Clear Hash type button')
         send_command('uciok')
 
+    def handle_setoption(self, args):
+        if 'name' not in args: return
+
+        name_idx = args.index('name')
+        value_idx = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[name_idx + 1:value_idx]).lower()
+        value = ' '.join(args[value_idx + 1:])
+
+        try:
+            if name == 'threads': self.engine.set_threads(max(1, min(int(value), MAX_THREADS)))
+            elif name == 'ponder': pass # the GUI decides when to ponder
+            elif name == 'multipv': self.engine.multipv = max(1, min(int(value), MAX_MULTIPV))
+            elif name == 'move overhead': self.engine.time_manager.move_overhead = max(0, min(int(value), 5000))
+            elif name == 'eval hash': self.engine.eval_cache = EvalHashTable(max(1, min(int(value), MAX_EVAL_HASH_MB)))
+            elif name == 'clear hash':
+                self.engine.tt.clear()
+                self.engine.pawn_hash.clear()
+                self.engine.eval_cache.clear()
+            else: send_info_string(f"unknown option: {name}")
+        except ValueError:
+            send_info_string(f"invalid value for {name}: {value}")
+
+    def handle_quit(self):
+        self.engine.stop()
+        self.wait_for_search()
+        self.engine.close()
+        sys.exit()
+
+    def handle_save_hash(self, path):
+        if not path: return send_info_string("usage: savehash <file>")
+        try:
+            self.engine.tt.save(path)
+            send_info_string(f"hash saved to {path}")
+        except OSError as error:
+            send_info_string(f"could not save hash: {error}")
+
+    def handle_load_hash(self, path):
+        """Map a saved table back in, the file is kept up to date as the engine searches"""
+        if not path: return send_info_string("usage: loadhash <file>")
+        try:
+            self.engine.load_tt(path)
+            send_info_string(f"hash mapped from {path}")
+        except (OSError, ValueError) as error:
+            send_info_string(f"could not load hash: {error}")
+
     def handle_new_game(self):
-        self.engine.tt.clear()
+        # pawn structure scores don't depend on the game, so only the TT ages
+        self.engine.tt.new_game()
         self.engine.ordering.clear()
-        self.engine.pawn_hash = type(self.engine.pawn_hash)(16)
+        self.engine.stack.clear()
         self.state.history = []
 
     def handle_position(self, args):
@@ -1,7 +1,6 @@
 import time
 from engine.board.move_exec import make_move, unmake_move
-from engine.moves.generator import get_legal_moves, generate_pseudo_legal_moves
-from engine.moves.legality import is_in_check
+from engine.moves.generator import get_legal_moves
 from engine.search.evaluation import evaluate as static_eval, MAX_PHASE
 from engine.core.move import move_to_uci
 from engine.search.utils import state_to_board
@@ -35,13 +34,14 @@ def perft(state, depth):
     def _perft_recursive(state, depth):
         if depth == 0: return 1
         
+        # the generator is fully legal, so the last ply is just a count
+        moves = get_legal_moves(state)
+        if depth == 1: return len(moves)
+
         nodes = 0
-        moves = generate_pseudo_legal_moves(state)
-        
         for move in moves:
             make_move(state, move)
-            if not is_in_check(state, not state.is_white):
-                nodes += _perft_recursive(state, depth - 1)
+            nodes += _perft_recursive(state, depth - 1)
             unmake_move(state, move)
             
         return nodes
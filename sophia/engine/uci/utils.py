@@ -1,5 +1,13 @@
+import sys
+import threading
+
+# the search thread and the input thread both write to stdout
+_output_lock = threading.Lock()
+
 def send_command(command : str) -> str:
-    print(command, flush=True)
+    with _output_lock:
+        sys.stdout.write(command + '\n')
+        sys.stdout.flush()
 
 def send_info_string(string : str) -> str:
     send_command(f'info string {string}')
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the engine is imported as the top-level 'engine' package from sophia/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from engine.board.fen_parser import load_from_fen
+from engine.board.move_exec import make_move, unmake_move
+from engine.moves.generator import get_legal_moves
+from engine.search import search
+from engine.search.evaluation import evaluate, evaluate_lazy
+from engine.search.limits import SearchLimits
+
+ENDGAMES = [
+    'k7/8/8/3p4/4K3/8/8/7R w - - 0 1',
+    'k7/p7/8/3p4/4K3/R7/8/7R w - - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1',
+    '8/5pk1/6p1/8/3Q4/8/5PPP/6K1 w - - 0 1',
+    '2r3k1/5ppp/8/3N4/8/8/5PPP/6K1 w - - 0 1',
+]
+MIDDLEGAME = 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10'
+
+def _positions(fen, depth=2):
+    """The position and everything reachable from it within depth plies"""
+    state = load_from_fen(fen)
+    def walk(depth):
+        yield state
+        if depth == 0: return
+        for move in get_legal_moves(state):
+            make_move(state, move)
+            yield from walk(depth - 1)
+            unmake_move(state, move)
+    yield from walk(depth)
+
+@pytest.mark.parametrize('fen', ENDGAMES)
+def test_lazy_bounds_hold_in_endgames(fen):
+    """An early exit must be a true bound on the full eval, on the side of the window it claims"""
+    rng = random.Random(fen)
+    for state in _positions(fen):
+        full = evaluate(state)
+        for low in (full - 30, full - 5, full + 5, full + 30, rng.randint(-2000, 2000)):
+            for high in (low + 1, low + 50, 10 ** 6):
+                score, exact = evaluate_lazy(state, low, high)
+                if exact: assert score == full
+                elif score >= high: assert full >= score
+                else: assert score <= low and full <= score
+
+def _full_eval(state, low, high, pawn_hash_table=None, material_table=None, eval_table=None):
+    return evaluate(state, pawn_hash_table, material_table, eval_table), True
+
+@pytest.mark.parametrize('fen', ENDGAMES[:3] + [MIDDLEGAME])
+def test_lazy_eval_does_not_change_the_search(fen, monkeypatch):
+    def nodes():
+        engine = search.SearchEngine(1)
+        engine.get_best_move(load_from_fen(fen), limits=SearchLimits(depth=6))
+        return engine.nodes_searched
+
+    lazy = nodes()
+    monkeypatch.setattr(search, 'evaluate_lazy', _full_eval)
+    assert nodes() == lazy
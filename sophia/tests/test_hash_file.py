@@ -0,0 +1,47 @@
+import pytest
+
+from engine.board.fen_parser import load_from_fen
+from engine.search.search import SearchEngine
+from engine.search.limits import SearchLimits
+from engine.search.transposition import MappedTranspositionTable, FILE_MAGIC
+
+def test_save_over_the_mapped_file(tmp_path):
+    """savehash to the file loadhash mapped must not truncate it under the live map"""
+    path = str(tmp_path / 'tt.hash')
+    state = load_from_fen()
+    engine = SearchEngine(1)
+    engine.get_best_move(state, limits=SearchLimits(depth=3))
+    engine.tt.save(path)
+
+    engine.load_tt(path)
+    engine.tt.save(path)
+    engine.get_best_move(state, limits=SearchLimits(depth=4))
+    engine.close()
+
+    tt = MappedTranspositionTable(path)
+    try:
+        entry = tt.probe(state.hash)
+        assert entry is not None and entry.depth >= 4
+    finally:
+        tt.close()
+
+def test_save_a_mapped_table_elsewhere(tmp_path):
+    state = load_from_fen()
+    engine = SearchEngine(1)
+    engine.get_best_move(state, limits=SearchLimits(depth=3))
+    engine.tt.save(str(tmp_path / 'a.hash'))
+
+    engine.load_tt(str(tmp_path / 'a.hash'))
+    engine.tt.save(str(tmp_path / 'b.hash'))
+    engine.close()
+
+    tt = MappedTranspositionTable(str(tmp_path / 'b.hash'))
+    try: assert tt.probe(state.hash) is not None
+    finally: tt.close()
+
+@pytest.mark.parametrize('contents', [b'', b'SOP', FILE_MAGIC + bytes(8)])
+def test_short_file_is_rejected(tmp_path, contents):
+    path = tmp_path / 'short.hash'
+    path.write_bytes(contents)
+    with pytest.raises(ValueError):
+        MappedTranspositionTable(str(path))
@@ -0,0 +1,32 @@
+import pytest
+
+from engine.board.fen_parser import load_from_fen
+from engine.core.move import move_to_uci
+from engine.moves.generator import get_legal_moves
+from engine.search.see import see_ge
+
+def _move(state, uci):
+    return next(move for move in get_legal_moves(state) if move_to_uci(move) == uci)
+
+@pytest.mark.parametrize('fen, uci, value', [
+    # en passant, free and recaptured
+    ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 'e5d6', 100),
+    ('4k3/2p5/8/3pP3/8/8/8/4K3 w - d6 0 1', 'e5d6', 0),
+    # promotion captures of an undefended rook, every promotion piece
+    ('r3k3/1P6/8/8/8/8/8/4K3 w - - 0 1', 'b7a8q', 563),
+    ('r3k3/1P6/8/8/8/8/8/4K3 w - - 0 1', 'b7a8r', 563),
+    ('r3k3/1P6/8/8/8/8/8/4K3 w - - 0 1', 'b7a8b', 563),
+    ('r3k3/1P6/8/8/8/8/8/4K3 w - - 0 1', 'b7a8n', 563),
+    # x-rays: the second rook joins once the first has captured
+    ('3r3k/8/8/3p4/8/8/3R4/3RK3 w - - 0 1', 'd2d5', 100),
+    ('3r3k/3r4/8/3p4/8/8/3R4/3RK3 w - - 0 1', 'd2d5', 100 - 563),
+    # bishop behind a queen on the diagonal
+    ('7k/8/5n2/8/8/2Q5/1B6/K7 w - - 0 1', 'c3f6', 305),
+    ('7k/6p1/5n2/8/8/2Q5/1B6/K7 w - - 0 1', 'c3f6', 305 - 950 + 100),
+])
+def test_see_ge_threshold(fen, uci, value):
+    """see_ge is exact at the boundary: true at the exchange value, false one above it"""
+    state = load_from_fen(fen)
+    move = _move(state, uci)
+    assert see_ge(state, move, value)
+    assert not see_ge(state, move, value + 1)
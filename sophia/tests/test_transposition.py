@@ -0,0 +1,47 @@
+import pytest
+
+from engine.core.constants import INFINITY
+from engine.search.transposition import (
+    TranspositionTable, SharedTranspositionTable,
+    FLAG_EXACT, FLAG_LOWERBOUND, FLAG_UPPERBOUND, BUCKET_SIZE
+)
+
+KEY = 0x0123456789ABCDEF
+
+@pytest.fixture(params=['local', 'shared'])
+def tt(request):
+    if request.param == 'local':
+        yield TranspositionTable(1)
+    else:
+        table = SharedTranspositionTable(1)
+        yield table
+        table.close()
+
+def test_fully_pruned_score_round_trips(tt):
+    """A node whose moves were all pruned reports -INFINITY * 10, it must store and probe back as a fail low"""
+    tt.store(KEY, 3, -INFINITY * 10, FLAG_UPPERBOUND, None)
+    entry = tt.probe(KEY)
+    assert entry is not None
+    assert entry.flag == FLAG_UPPERBOUND
+    assert entry.score <= -INFINITY
+
+def test_stale_deep_entries_are_replaced(tt):
+    """A full bucket of deep entries from an earlier search must not block a shallow store from this one"""
+    stride = tt.bucket_mask + 1 # keys this far apart share a bucket
+    for i in range(BUCKET_SIZE):
+        tt.store(KEY + i * stride, 40, 10, FLAG_EXACT, None)
+    tt.new_search()
+
+    fresh = KEY + BUCKET_SIZE * stride
+    tt.store(fresh, 1, 20, FLAG_LOWERBOUND, None)
+    entry = tt.probe(fresh)
+    assert entry is not None
+    assert entry.depth == 1 and entry.score == 20
+
+def test_current_deep_entries_are_kept(tt):
+    stride = tt.bucket_mask + 1
+    for i in range(BUCKET_SIZE):
+        tt.store(KEY + i * stride, 40, 10, FLAG_EXACT, None)
+
+    tt.store(KEY + BUCKET_SIZE * stride, 1, 20, FLAG_LOWERBOUND, None)
+    assert tt.probe(KEY + BUCKET_SIZE * stride) is None